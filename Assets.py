@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import struct
+
+
+class AssetManifest:
+    # class that loads the dictionary of the game assets (pngs) once per process and shares it
+    # the dictionary has the same format Find_Dino_Images returned:
+    # {name: [{'path': path to png, 'size': (width, height)}, ...]} (names without the number, e.g. 'DinoRun')
+    # the sizes are read from the png headers only and are saved to an index file in the assets directory
+    # that is keyed on the file modification times, so a second run doesn't read the pngs at all
+    INDEX_FILENAME = 'manifest.json' # the index file saved inside the assets directory
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+    CACHE = {} # assets path -> loaded dictionary (process wide)
+
+    @staticmethod
+    def load(path='assets', persist=True):
+        # returns the asset dictionary of the passed assets directory, loads it only the first time it is asked for
+        # if persist is true the index file is used and updated
+        key = os.path.abspath(path)
+        if key not in AssetManifest.CACHE:
+            AssetManifest.CACHE[key] = AssetManifest.build(path, persist)
+        return AssetManifest.CACHE[key]
+
+    @staticmethod
+    def clear():
+        # forgets all the loaded dictionaries (the next load scans the directory again)
+        AssetManifest.CACHE.clear()
+
+    @staticmethod
+    def build(path, persist=True):
+        # scans the assets directory and creates the asset dictionary
+        # only pngs that aren't in the index file (or that changed since) have their headers read
+        index_path = os.path.join(path, AssetManifest.INDEX_FILENAME)
+        index = AssetManifest.read_index(index_path) if persist else {}
+        new_index = {}
+
+        images = {}
+        for folder in sorted(os.scandir(path), key=lambda e: e.name):
+            if not folder.is_dir():
+                continue
+            for entry in sorted(os.scandir(folder.path), key=lambda e: e.name):
+                if not entry.name.endswith('.png'):
+                    continue
+                file_path = os.path.join(path, folder.name, entry.name)
+                rel = folder.name + '/' + entry.name
+                mtime = entry.stat().st_mtime
+
+                cached = index.get(rel)
+                if cached is not None and cached['mtime'] == mtime:
+                    size = tuple(cached['size'])
+                else:
+                    size = AssetManifest.png_size(file_path)
+                new_index[rel] = {'mtime': mtime, 'size': list(size)}
+
+                name = re.sub(r'[0-9]?\.png$', '', entry.name)
+                images.setdefault(name, []).append({'path': file_path, 'size': size})
+
+        if persist and new_index != index:
+            AssetManifest.write_index(index_path, new_index)
+        return images
+
+    @staticmethod
+    def png_size(file_path):
+        # returns the (width, height) of a png by reading only its header (the IHDR chunk)
+        with open(file_path, 'rb') as f:
+            header = f.read(24)
+        if header[:8] != AssetManifest.PNG_SIGNATURE or header[12:16] != b'IHDR':
+            raise ValueError(f"not a png file: {file_path}")
+        return struct.unpack('>II', header[16:24])
+
+    @staticmethod
+    def read_index(index_path):
+        # returns the saved index or an empty index if it doesn't exist or can't be read
+        try:
+            with open(index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def write_index(index_path, index):
+        # saves the index, a read only assets directory just means the index isn't saved
+        # the index is written to a temporary file first so processes loading at the same time never see half of it
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+
+
+class TextureAtlas:
+    # class that packs the pngs of the assets directory into a single image (the atlas) so all the sprites
+    # are regions of one texture, the region of every png is saved to a json index next to the atlas
+    # the atlas is built once and rebuilt only when a png was changed (the index keeps the modification times)
+    # pngs larger than MAX_SIZE (e.g. the track) aren't packed and are loaded on their own
+    IMAGE_FILENAME = 'atlas.png'
+    INDEX_FILENAME = 'atlas.json'
+    MAX_SIZE = 2048 # the maximum width of the atlas
+    PADDING = 2 # empty pixels around every region so neighbouring sprites don't bleed into each other
+
+    CACHE = {} # assets path -> loaded index (process wide)
+
+    @staticmethod
+    def load(path='assets'):
+        # returns the index of the atlas of the passed assets directory (built if it is missing or out of date)
+        # the index is {'size': [width, height], 'regions': {'folder/name.png': [x, y, width, height]}, ...}
+        # with the regions measured from the top left corner of the image, returns None if it can't be built
+        key = os.path.abspath(path)
+        if key not in TextureAtlas.CACHE:
+            TextureAtlas.CACHE[key] = TextureAtlas.build(path)
+        return TextureAtlas.CACHE[key]
+
+    @staticmethod
+    def sources(path):
+        # returns the modification time of every png in the folders of the assets directory
+        sources = {}
+        for folder in sorted(os.scandir(path), key=lambda e: e.name):
+            if not folder.is_dir():
+                continue
+            for entry in sorted(os.scandir(folder.path), key=lambda e: e.name):
+                if entry.name.endswith('.png'):
+                    sources[folder.name + '/' + entry.name] = entry.stat().st_mtime
+        return sources
+
+    @staticmethod
+    def build(path, force=False):
+        # packs the pngs into the atlas and saves it with its index, an up to date atlas is only read
+        # returns the index or None if the atlas can't be built (e.g. Pillow isn't installed)
+        index_path = os.path.join(path, TextureAtlas.INDEX_FILENAME)
+        image_path = os.path.join(path, TextureAtlas.IMAGE_FILENAME)
+        sources = TextureAtlas.sources(path)
+        index = AssetManifest.read_index(index_path)
+        if not force and index.get('sources') == sources and os.path.exists(image_path):
+            return index
+
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        sizes = {rel: AssetManifest.png_size(os.path.join(path, rel)) for rel in sources}
+        packed = {rel: size for rel, size in sizes.items()
+                  if size[0] + 2 * TextureAtlas.PADDING <= TextureAtlas.MAX_SIZE}
+        regions, width, height = TextureAtlas.pack(packed)
+
+        atlas = Image.new('RGBA', (width, height))
+        for rel, (x, y, w, h) in regions.items():
+            with Image.open(os.path.join(path, rel)) as image:
+                atlas.paste(image.convert('RGBA'), (x, y))
+        index = {'size': [width, height], 'sources': sources, 'regions': regions}
+        try:
+            tmp_path = f"{image_path}.{os.getpid()}.tmp"
+            atlas.save(tmp_path, format='PNG')
+            os.replace(tmp_path, image_path)
+            AssetManifest.write_index(index_path, index)
+        except OSError:
+            return None
+        return index
+
+    @staticmethod
+    def pack(sizes):
+        # packs rectangles of the passed sizes into rows (the tallest first)
+        # returns the region of every rectangle and the width and height of the atlas
+        regions = {}
+        pad = TextureAtlas.PADDING
+        width = min(TextureAtlas.MAX_SIZE, max([w for w, h in sizes.values()], default=0) + 2 * pad)
+        x = y = row_height = 0
+        for rel, (w, h) in sorted(sizes.items(), key=lambda i: (-i[1][1], i[0])):
+            if x + w + 2 * pad > width:
+                x = 0
+                y += row_height
+                row_height = 0
+            regions[rel] = [x + pad, y + pad, w, h]
+            x += w + 2 * pad
+            row_height = max(row_height, h + 2 * pad)
+        return regions, width, y + row_height
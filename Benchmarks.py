@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time as t
+import numpy as np
+from DinoGame import *
+from Trainer import HeadlessTrainer
+
+
+class Benchmark:
+    # class that times the simulation and evolution hot paths without a window (no kivy imports)
+    # every case times single calls with time.perf_counter and reports the calls per second and the
+    # genome frames (or genomes) per second with percentiles of the call time
+    # the results are saved as json so two runs (e.g. two commits) can be compared with --compare
+    ENGINES = HeadlessTrainer.ENGINES # the simulation engines that can be timed (the same as the trainer's)
+    PERCENTILES = (50, 90, 99)
+    SEED = 1 # every case runs deterministically so two runs simulate the same games
+    DT = DinoGen.FIXED_DT # the delta time of every frame
+
+    def __init__(self, pops=(50, 500, 5000), shapes=((3,), (8, 8)), engines=('object', 'vector'), samples=200,
+                 gens=3, max_frames=2000, path='assets'):
+        # an init function for the benchmark class
+        # the function receives the population sizes, the hidden layer sizes of the network shapes,
+        # the simulation engines, the number of timed calls of every case, the number of timed generations,
+        # the maximum number of frames of a timed generation (good networks can live for minutes)
+        # and the assets directory
+        self.pops = pops
+        self.shapes = [[(h, 1) for h in hidden] + [(DinoGameManager.OUT_LEN, 1)] for hidden in shapes]
+        self.engines = engines
+        self.samples = samples
+        self.gens = gens
+        self.max_frames = max_frames
+        self.path = path
+        self.results = []
+
+    @staticmethod
+    def stats(times, units):
+        # returns the statistics of the passed call times (seconds) that processed the passed number of units
+        # (genome frames, genomes ...) each, units can be a number or an array with the units of every call
+        times = np.asarray(times, dtype=np.float64)
+        units = np.broadcast_to(np.asarray(units, dtype=np.float64), times.shape)
+        total = times.sum()
+        stats = {'calls': len(times), 'total_s': total,
+                 'calls_per_s': len(times) / total if total > 0 else 0.0,
+                 'units_per_s': units.sum() / total if total > 0 else 0.0,
+                 'mean_ms': times.mean() * 1000, 'min_ms': times.min() * 1000}
+        for p in Benchmark.PERCENTILES:
+            stats[f'p{p}_ms'] = np.percentile(times, p) * 1000
+        return stats
+
+    def add(self, name, params, times, units, unit):
+        # saves and prints the result of a case
+        result = {'name': name, **params, 'unit': unit, **Benchmark.stats(times, units)}
+        self.results.append(result)
+        print(Benchmark.describe(result))
+
+    @staticmethod
+    def describe(result):
+        # returns a single line summary of a result
+        params = ' '.join(f"{k}={result[k]}" for k in ('engine', 'n', 'shape') if k in result)
+        return (f"{result['name']:<14} {params:<34} {result['calls_per_s']:>10.1f} calls/s "
+                f"{result['units_per_s']:>12.0f} {result['unit']}/s  p50 {result['p50_ms']:.3f}ms "
+                f"p90 {result['p90_ms']:.3f}ms p99 {result['p99_ms']:.3f}ms")
+
+    @staticmethod
+    def shape_name(net_shape):
+        # returns a short name of a network shape (the sizes of the layers)
+        return 'x'.join(str(l[0]) for l in net_shape)
+
+    def make_gen(self, engine, n, net_shape):
+        # returns an initialized deterministic generation of the passed engine
+        np.random.seed(Benchmark.SEED)
+        rd.seed(Benchmark.SEED)
+        gm = Benchmark.ENGINES[engine](n, seed=Benchmark.SEED)
+        gm.init_games(path=self.path)
+        gm.init_net(DinoGameManager.IN_LEN, net_shape, 'leaky_relu', 'leaky_relu', 'bell')
+        return gm
+
+    def bench_forward_pass(self, n, net_shape):
+        # times Nets.forward_pass on random inputs
+        nets = Nets(n, DinoGameManager.IN_LEN, net_shape, 'leaky_relu', 'leaky_relu', 'bell')
+        nets.net_weights_init()
+        inputs = np.random.random((n, DinoGameManager.IN_LEN, 1)) * 100
+        times = []
+        for _ in range(self.samples):
+            start = t.perf_counter()
+            nets.forward_pass(inputs, True)
+            times.append(t.perf_counter() - start)
+        self.add('forward_pass', {'n': n, 'shape': Benchmark.shape_name(net_shape)}, times, n, 'genomes')
+
+    def bench_mutate(self, n, net_shape):
+        # times Nets.mutate with two parents
+        nets = Nets(n, DinoGameManager.IN_LEN, net_shape, 'leaky_relu', 'leaky_relu', 'bell')
+        nets.net_weights_init()
+        times = []
+        for _ in range(max(self.samples // 10, 5)):
+            start = t.perf_counter()
+            nets.mutate([0, 1])
+            times.append(t.perf_counter() - start)
+        self.add('mutate', {'n': n, 'shape': Benchmark.shape_name(net_shape)}, times, n, 'genomes')
+
+    def bench_single_frame(self, engine, n, net_shape):
+        # times DinoGen.single_frame, the units are the genomes that were alive in the frame
+        gm = self.make_gen(engine, n, net_shape)
+        times, alive = [], []
+        for _ in range(self.samples):
+            if not gm.not_all_dead():
+                gm.restart()
+            alive.append(gm.check_dead())
+            start = t.perf_counter()
+            gm.single_frame(Benchmark.DT)
+            times.append(t.perf_counter() - start)
+        self.add('single_frame', {'engine': engine, 'n': n, 'shape': Benchmark.shape_name(net_shape)}, times, alive,
+                 'genome_frames')
+
+    def bench_generation(self, engine, n, net_shape):
+        # times whole generations (run until all the dinos are dead or max_frames frames, mutate and restart)
+        gm = self.make_gen(engine, n, net_shape)
+        times, frames = [], []
+        for _ in range(self.gens):
+            count = 0
+            start = t.perf_counter()
+            for _ in range(self.max_frames):
+                if not gm.not_all_dead():
+                    break
+                count += gm.check_dead()
+                gm.return_best()
+                gm.single_frame(Benchmark.DT)
+            gm.mutate()
+            gm.restart()
+            times.append(t.perf_counter() - start)
+            frames.append(count)
+        self.add('generation', {'engine': engine, 'n': n, 'shape': Benchmark.shape_name(net_shape)}, times, frames,
+                 'genome_frames')
+
+    def bench_game(self):
+        # times DinoGameManager.updateAll and DinoGameManager.spawn of a single game
+        game = DinoGameManager(path=self.path, rng=np.random.default_rng(Benchmark.SEED))
+        times = []
+        for _ in range(self.samples * 10):
+            if not game.dino_not_dead():
+                game.reset()
+            start = t.perf_counter()
+            game.updateAll(Benchmark.DT)
+            times.append(t.perf_counter() - start)
+        self.add('updateAll', {}, times, 1, 'frames')
+
+        times = []
+        for _ in range(self.samples * 10):
+            game.obstacles = []
+            start = t.perf_counter()
+            game.spawn()
+            times.append(t.perf_counter() - start)
+        self.add('spawn', {}, times, 1, 'obstacles')
+
+    def run(self):
+        # runs all the cases and returns the results
+        self.results = []
+        self.bench_game()
+        for net_shape in self.shapes:
+            for n in self.pops:
+                self.bench_forward_pass(n, net_shape)
+                self.bench_mutate(n, net_shape)
+                for engine in self.engines:
+                    self.bench_single_frame(engine, n, net_shape)
+                    self.bench_generation(engine, n, net_shape)
+        return self.results
+
+    @staticmethod
+    def meta():
+        # returns information about the run (commit, versions and machine) saved with the results
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {'commit': commit, 'time': t.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                'numpy': np.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+                'cpus': os.cpu_count()}
+
+    def save(self, filename):
+        # saves the results and the information about the run to a json file
+        with open(filename, 'w') as f:
+            json.dump({'meta': Benchmark.meta(), 'results': self.results}, f, indent=1)
+
+    @staticmethod
+    def key(result):
+        # returns the key that identifies the case of a result (for comparing two runs)
+        return tuple(result.get(k) for k in ('name', 'engine', 'n', 'shape'))
+
+    def compare(self, filename):
+        # prints the speedup of every case over the results saved in a json file (above 1 is faster)
+        with open(filename) as f:
+            old = json.load(f)
+        old_results = {Benchmark.key(r): r for r in old['results']}
+        print(f"compared to {filename} (commit {old['meta'].get('commit')}):")
+        for result in self.results:
+            prev = old_results.get(Benchmark.key(result))
+            if prev is None or prev['units_per_s'] == 0:
+                continue
+            speedup = result['units_per_s'] / prev['units_per_s']
+            params = ' '.join(str(v) for v in Benchmark.key(result)[1:] if v is not None)
+            print(f"{result['name']:<14} {params:<24} {speedup:6.2f}x")
+
+
+def main(argv=None):
+    # command line entry point, e.g. python -m Benchmarks --out bench.json
+    parser = argparse.ArgumentParser(prog='Benchmarks', description='time the simulation and evolution hot paths')
+    parser.add_argument('--pops', type=int, nargs='+', default=[50, 500, 5000], help='population sizes')
+    parser.add_argument('--shapes', nargs='+', default=['3', '8,8'],
+                        help='hidden layer sizes of the network shapes, e.g. 3 8,8')
+    parser.add_argument('--engines', nargs='+', choices=Benchmark.ENGINES, default=list(Benchmark.ENGINES),
+                        help='simulation engines')
+    parser.add_argument('--samples', type=int, default=200, help='number of timed calls of every case')
+    parser.add_argument('--gens', type=int, default=3, help='number of timed generations of every case')
+    parser.add_argument('--max-frames', type=int, default=2000, help='maximum number of frames of a timed generation')
+    parser.add_argument('--quick', action='store_true', help='a short run (small populations and few samples)')
+    parser.add_argument('--out', default=None, help='json file to save the results to')
+    parser.add_argument('--compare', default=None, help='json file of an earlier run to compare the results to')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.pops = [p for p in args.pops if p <= 500]
+        args.samples = min(args.samples, 50)
+        args.gens = 1
+    shapes = [tuple(int(h) for h in s.split(',') if h) for s in args.shapes]
+    bench = Benchmark(args.pops, shapes, args.engines, args.samples, args.gens, args.max_frames)
+    bench.run()
+    if args.out is not None:
+        bench.save(args.out)
+        print(f"saved the results to {args.out}")
+    if args.compare is not None:
+        bench.compare(args.compare)
+
+
+if __name__ == '__main__':
+    main()
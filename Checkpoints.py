@@ -0,0 +1,356 @@
+import json
+import os
+import queue
+import threading
+import numpy as np
+from DinoGame import DinoGameManager
+from NetworkClasses import Nets
+
+
+class PlayerArchive:
+    # a pickle free archive of the best players (one player per generation) saved as a directory:
+    # header.json - the shape of the networks (net_shape, number of inputs and outputs)
+    # scores.npy - a float array of the score of every player
+    # params.npy - a (players x parameters) float matrix, every row is the flat weights and biases of a network
+    # the arrays are opened with np.load(mmap_mode='r') so opening takes the same time for any number of players
+    # and only the rows that are used are read from the disk
+    # indexing the archive returns the same (score, [weights], [biases]) tuples the old best players list has
+    DEFAULT_PATH = 'best_players' # the default archive directory
+    LEGACY_FILENAME = 'best_players.npy' # the old pickled best players file
+    HEADER_FILENAME = 'header.json'
+    SCORES_FILENAME = 'scores.npy'
+    PARAMS_FILENAME = 'params.npy'
+    POPULATION_FILENAME = 'population_{:06d}.npy' # the latest full population (written by ArchiveWriter if asked to)
+    STATE_FILENAME = 'state.json' # the training state of the latest population (generation, lineage, random states)
+    VERSION = 1
+    NPY_HEADER_LEN = 128 # the .npy headers have a fixed size so the number of rows can be rewritten in place
+
+    def __init__(self, path, header, scores, params):
+        # an init function for the archive class, use open or save to create an archive
+        self.path = path
+        self.header = header
+        self.net_shape = [tuple(l) for l in header['net_shape']]
+        self.input_length = header['in_len']
+        self.output_length = header['out_len']
+        self.shapes = Nets.layer_shapes(self.input_length, self.net_shape)
+
+        self.scores = scores
+        self.params = params
+
+    def __len__(self):
+        # returns the number of players in the archive
+        return len(self.scores)
+
+    def __getitem__(self, i):
+        # returns the ith player as a (score, [weights], [biases]) tuple, the weights and biases are read only views
+        ws, bs = self.unflatten(self.params[i])
+        return float(self.scores[i]), ws, bs
+
+    def __iter__(self):
+        # iterates over all the players
+        for i in range(len(self)):
+            yield self[i]
+
+    def best_index(self):
+        # returns the index of the player with the highest score
+        return int(np.argmax(self.scores))
+
+    def unflatten_population(self, matrix):
+        # splits a (n x parameters) matrix into the weights (n, neurons, previous neurons) and biases of every layer
+        weights, bias = [], []
+        offset = 0
+        for w, b in self.shapes:
+            weights += [np.array(matrix[:, offset:offset + w[0] * w[1]]).reshape(-1, *w)]
+            offset += w[0] * w[1]
+            bias += [np.array(matrix[:, offset:offset + b[0]]).reshape(-1, *b)]
+            offset += b[0]
+        return weights, bias
+
+    def load_state(self):
+        # returns the weights and biases of the latest saved population and the training state saved with it
+        # raises FileNotFoundError if the archive was written without the population
+        with open(os.path.join(self.path, PlayerArchive.STATE_FILENAME)) as f:
+            state = json.load(f)
+        matrix = np.load(os.path.join(self.path, state['population']), allow_pickle=False)
+        if matrix.ndim != 2 or matrix.shape[1] != self.header['params_len']:
+            raise ValueError(f"corrupted population in archive: {self.path}")
+        return (*self.unflatten_population(matrix), state)
+
+    def unflatten(self, params):
+        # splits a flat parameter row into the weights and biases of every layer
+        ws, bs = [], []
+        offset = 0
+        for w, b in self.shapes:
+            ws += [params[offset:offset + w[0] * w[1]].reshape(w)]
+            offset += w[0] * w[1]
+            bs += [params[offset:offset + b[0]].reshape(b)]
+            offset += b[0]
+        return ws, bs
+
+    @staticmethod
+    def flatten(ws, bs):
+        # returns the weights and biases of a network as a single flat row
+        return np.concatenate([np.ravel(a) for w, b in zip(ws, bs) for a in (w, b)]).astype(np.float64)
+
+    @staticmethod
+    def flatten_population(weights, bias):
+        # returns the weights and biases of n networks as a (n x parameters) matrix (the same order as flatten)
+        n = len(weights[0])
+        return np.concatenate([a.reshape(n, -1) for w, b in zip(weights, bias) for a in (w, b)], axis=1)
+
+    @staticmethod
+    def params_len(input_length, net_shape):
+        # returns the number of parameters in a network of the passed shape
+        return sum(w[0] * w[1] + b[0] for w, b in Nets.layer_shapes(input_length, net_shape))
+
+    @staticmethod
+    def make_header(net_shape, input_length=DinoGameManager.IN_LEN, output_length=DinoGameManager.OUT_LEN):
+        # returns the header of an archive of networks with the passed shape
+        return {'version': PlayerArchive.VERSION, 'net_shape': [list(l) for l in net_shape],
+                'in_len': input_length, 'out_len': output_length,
+                'params_len': PlayerArchive.params_len(input_length, net_shape)}
+
+    @staticmethod
+    def save(path, players, net_shape, input_length=DinoGameManager.IN_LEN, output_length=DinoGameManager.OUT_LEN):
+        # saves a list of (score, [weights], [biases]) players to an archive directory and returns the opened archive
+        header = PlayerArchive.make_header(net_shape, input_length, output_length)
+        scores = np.array([p[0] for p in players], dtype=np.float64)
+        params = np.zeros((len(players), header['params_len']))
+        for i, p in enumerate(players):
+            params[i] = PlayerArchive.flatten(p[1], p[2])
+
+        os.makedirs(path, exist_ok=True)
+        PlayerArchive.write_npy(os.path.join(path, PlayerArchive.SCORES_FILENAME), scores)
+        PlayerArchive.write_npy(os.path.join(path, PlayerArchive.PARAMS_FILENAME), params)
+        PlayerArchive.write_json(os.path.join(path, PlayerArchive.HEADER_FILENAME), header)
+        return PlayerArchive.open(path)
+
+    @staticmethod
+    def open(path):
+        # opens an archive directory (memory mapped, nothing is unpickled), raises FileNotFoundError if there isn't one
+        with open(os.path.join(path, PlayerArchive.HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header.get('version') != PlayerArchive.VERSION:
+            raise ValueError(f"unsupported archive version: {header.get('version')}")
+
+        scores = PlayerArchive.read_npy(os.path.join(path, PlayerArchive.SCORES_FILENAME))
+        params = PlayerArchive.read_npy(os.path.join(path, PlayerArchive.PARAMS_FILENAME))
+        if params.ndim != 2 or params.shape[1] != header['params_len']:
+            raise ValueError(f"corrupted archive: {path}")
+        # an append that was cut in the middle can leave one array a row longer than the other
+        rows = min(len(scores), len(params))
+        return PlayerArchive(path, header, scores[:rows], params[:rows])
+
+    @staticmethod
+    def convert(legacy_filename, path, output_length=DinoGameManager.OUT_LEN):
+        # converts an old pickled best players file to an archive directory and returns the opened archive
+        # the network shape is taken from the saved weights (only convert files you trust, they are unpickled)
+        players = np.load(legacy_filename, allow_pickle=True)
+        ws = players[0][1]
+        net_shape = [(w.shape[0], 1) for w in ws]
+        return PlayerArchive.save(path, list(players), net_shape, ws[0].shape[1], output_length)
+
+    @staticmethod
+    def write_npy(filename, array, sync=False):
+        # saves an array as a .npy file with a header of NPY_HEADER_LEN bytes
+        # (np.save picks the header size by itself, a fixed size lets the shape be rewritten in place)
+        # if sync is true the file is on the disk before it replaces the old one
+        array = np.ascontiguousarray(array, dtype='<f8')
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(PlayerArchive.npy_header(array.shape))
+            array.tofile(f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(filename + '.tmp', filename)
+
+    @staticmethod
+    def npy_header(shape):
+        # returns a version 1.0 .npy header of a float64 array with the passed shape
+        desc = "{'descr': '<f8', 'fortran_order': False, 'shape': %s, }" % repr(tuple(shape))
+        header_len = PlayerArchive.NPY_HEADER_LEN - 10 # magic string, version and the header length
+        desc = desc.ljust(header_len - 1) + '\n'
+        if len(desc) != header_len:
+            raise ValueError(f"shape too long for the header: {shape}")
+        return b'\x93NUMPY\x01\x00' + header_len.to_bytes(2, 'little') + desc.encode('latin1')
+
+    @staticmethod
+    def read_npy(filename):
+        # opens a .npy file memory mapped (empty arrays can't be memory mapped so they are read)
+        if os.path.getsize(filename) <= PlayerArchive.NPY_HEADER_LEN:
+            return np.load(filename, allow_pickle=False)
+        return np.load(filename, mmap_mode='r', allow_pickle=False)
+
+    @staticmethod
+    def write_json(filename, data, sync=False):
+        # saves a json file (written to a temporary file first so it is never half written)
+        # if sync is true the file is on the disk before it replaces the old one
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(data, f, indent=1)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(filename + '.tmp', filename)
+
+    @staticmethod
+    def sync_dir(path):
+        # makes sure the files replaced in a directory are on the disk (only possible on posix systems)
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def remove_state(path):
+        # removes the training state of an archive directory and the population it points to (if there is one)
+        filename = os.path.join(path, PlayerArchive.STATE_FILENAME)
+        try:
+            with open(filename) as f:
+                population = json.load(f).get('population')
+        except FileNotFoundError:
+            return
+        except ValueError:
+            population = None
+        if population is not None and os.path.exists(os.path.join(path, population)):
+            os.remove(os.path.join(path, population))
+        os.remove(filename)
+
+
+class ArchiveWriter:
+    # class that appends the best player of every generation to an archive directory on a background thread
+    # so saving costs a single row per generation and never stalls the game loop
+    # the rows are written to the end of the arrays and then the row count in the .npy headers is updated in place,
+    # the files are synced to the disk every sync_every generations and when the writer is closed
+    # if population is true the latest population and the training state are also saved (needed to resume training)
+    # when the files are synced: after the rows are on the disk the population is written to a new file, then the
+    # state that points to it (both synced before they replace anything) and then the old file is removed,
+    # so after a crash the saved state is never ahead of the saved rows
+    # a new archive (not appended to) has no training state until the writer saves one
+
+    def __init__(self, path, net_shape, input_length=DinoGameManager.IN_LEN, output_length=DinoGameManager.OUT_LEN,
+                 sync_every=10, population=False, append=False, rows=None):
+        # an init function for the archive writer class
+        # the function receives the archive directory, the shape of the networks, the number of generations
+        # between syncs, whether to save the population, whether to append to an existing archive
+        # (if false the archive is started over) and the number of existing rows to keep when appending
+        # (all of them by default, rows after them are overwritten)
+        self.path = path
+        self.header = PlayerArchive.make_header(net_shape, input_length, output_length)
+        self.sync_every = sync_every
+        self.population = population
+        self.population_file = None # the name of the latest population file
+        self.state = None # the latest population and training state, saved at the next sync
+
+        if append and os.path.exists(os.path.join(path, PlayerArchive.HEADER_FILENAME)):
+            archive = PlayerArchive.open(path)
+            if archive.header['params_len'] != self.header['params_len'] or archive.net_shape != \
+                    [tuple(l) for l in net_shape]:
+                raise ValueError(f"the archive {path} has networks of a different shape")
+            self.rows = len(archive) if rows is None else min(rows, len(archive))
+            try:
+                with open(os.path.join(path, PlayerArchive.STATE_FILENAME)) as f:
+                    self.population_file = json.load(f)['population']
+            except (OSError, ValueError, KeyError):
+                pass
+        else:
+            PlayerArchive.save(path, [], net_shape, input_length, output_length)
+            PlayerArchive.remove_state(path) # the state of an older run doesn't match the new archive
+            self.rows = 0
+
+        self.scores_file = open(os.path.join(path, PlayerArchive.SCORES_FILENAME), 'r+b')
+        self.params_file = open(os.path.join(path, PlayerArchive.PARAMS_FILENAME), 'r+b')
+        self.write_headers()
+        self.unsynced = 0
+        self.error = None # an error raised on the background thread (raised again by put and close)
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, player):
+        # hands a (score, [weights], [biases]) player to the background thread to be appended
+        if self.error is not None:
+            raise self.error
+        self.queue.put((self.write, (player,)))
+
+    def put_state(self, weights, bias, state):
+        # hands the weights and biases of the whole population and the training state (a json serializable
+        # dictionary, see DinoGen.get_state) to the background thread, ignored if the population isn't saved
+        # (the state is handed after the player of its generation and is saved with the next sync)
+        # the arrays must not be changed in place afterwards (Nets.mutate creates new ones)
+        if self.error is not None:
+            raise self.error
+        if self.population:
+            self.queue.put((self.write_state, (weights, bias, state)))
+
+    def run(self):
+        # the background thread, does the writes handed to it until None is put
+        while (item := self.queue.get()) is not None:
+            try:
+                item[0](*item[1])
+            except Exception as e:
+                self.error = e
+                return
+
+    def write(self, player):
+        # appends a player to the archive and updates the headers
+        params_len = self.header['params_len']
+        self.params_file.seek(PlayerArchive.NPY_HEADER_LEN + self.rows * params_len * 8)
+        self.params_file.write(PlayerArchive.flatten(player[1], player[2]).astype('<f8').tobytes())
+        self.scores_file.seek(PlayerArchive.NPY_HEADER_LEN + self.rows * 8)
+        self.scores_file.write(np.array([player[0]], dtype='<f8').tobytes())
+        self.rows += 1
+        self.write_headers()
+
+        self.unsynced += 1
+        if not self.population and self.unsynced >= self.sync_every: # with the population the state syncs
+            self.sync()
+
+    def write_headers(self):
+        # writes the current number of rows to the .npy headers
+        self.params_file.seek(0)
+        self.params_file.write(PlayerArchive.npy_header((self.rows, self.header['params_len'])))
+        self.scores_file.seek(0)
+        self.scores_file.write(PlayerArchive.npy_header((self.rows,)))
+
+    def write_state(self, weights, bias, state):
+        # keeps the latest population and state until the next sync (every sync_every generations)
+        self.state = (weights, bias, state)
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def save_state(self, weights, bias, state):
+        # saves the population to a new file, then the state that points to it and removes the old population file
+        filename = PlayerArchive.POPULATION_FILENAME.format(state['gen'])
+        PlayerArchive.write_npy(os.path.join(self.path, filename), PlayerArchive.flatten_population(weights, bias),
+                                sync=True)
+        PlayerArchive.write_json(os.path.join(self.path, PlayerArchive.STATE_FILENAME),
+                                 {**state, 'population': filename}, sync=True)
+        PlayerArchive.sync_dir(self.path)
+        if self.population_file is not None and self.population_file != filename:
+            os.remove(os.path.join(self.path, self.population_file))
+        self.population_file = filename
+
+    def sync(self):
+        # makes sure everything written so far is on the disk, the rows first and then the latest state
+        for f in (self.params_file, self.scores_file):
+            f.flush()
+            os.fsync(f.fileno())
+        if self.state is not None:
+            self.save_state(*self.state)
+            self.state = None
+        self.unsynced = 0
+
+    def close(self):
+        # writes everything that is left, syncs and closes the files
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is None:
+            self.sync()
+        self.params_file.close()
+        self.scores_file.close()
+        if self.error is not None:
+            raise self.error
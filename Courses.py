@@ -0,0 +1,109 @@
+import numpy as np
+from DinoGame import DinoGameManager
+from VecDinoGame import VecDinoGen
+
+
+class ObstacleSchedule:
+    # class that pre-generates the obstacle courses of every generation (common random numbers)
+    # instead of every game drawing its own obstacles, a generation has K courses and every game runs one of
+    # them (game i runs course i % K), so with K = 1 all the dinos face the same obstacles and the scores
+    # compare the networks instead of their luck
+    # a course is a sequence of (kind, type) draws in the format of DinoGameManager.draw_obstacle, kept as
+    # (K x length) arrays that are extended by whole chunks when a game gets further than the drawn part
+    # course c of generation g is drawn from its own stream (seed, g, c) so the courses don't depend on the
+    # order the games read them in and every process (see ParallelEval) builds the same courses
+    CHUNK = 64 # the number of obstacles drawn at once for every course
+
+    def __init__(self, courses=1, seed=None):
+        # an init function for the obstacle schedule class
+        # the function receives the number of courses in every generation and the seed of the courses
+        # (drawn from numpy.random if no seed is passed)
+        if courses < 1:
+            raise ValueError("a generation needs at least one course")
+        self.courses = courses
+        self.seed = int(np.random.randint(2**32)) if seed is None else seed
+        self.gen = None # the generation the courses were drawn for
+        self.rngs = [] # the random stream of every course
+        self.kinds = np.zeros((courses, 0), dtype=int) # the obstacle kind of every position of every course
+        self.types = np.zeros((courses, 0), dtype=int) # the obstacle type of every position of every course
+
+    def generate(self, gen):
+        # draws the courses of the passed generation (nothing is drawn if they are already drawn)
+        if gen == self.gen:
+            return
+        self.gen = gen
+        self.rngs = [np.random.default_rng([self.seed, gen, c]) for c in range(self.courses)]
+        self.kinds = np.zeros((self.courses, 0), dtype=int)
+        self.types = np.zeros((self.courses, 0), dtype=int)
+        self.extend()
+
+    def extend(self):
+        # draws the next chunk of every course
+        draws = np.stack([rng.integers(0, 3, size=(ObstacleSchedule.CHUNK, 2)) for rng in self.rngs])
+        self.kinds = np.concatenate((self.kinds, draws[:, :, 0]), axis=1)
+        self.types = np.concatenate((self.types, draws[:, :, 1]), axis=1)
+
+    def take(self, courses, positions):
+        # returns the kinds and types of the obstacles at the passed positions of the passed courses (arrays)
+        while len(positions) > 0 and positions.max() >= self.kinds.shape[1]:
+            self.extend()
+        return self.kinds[courses, positions], self.types[courses, positions]
+
+    def course_of(self, i):
+        # returns the course of the ith game (of the whole population)
+        return i % self.courses
+
+    def cursor(self, course):
+        # returns a cursor that reads the obstacles of a course in order (see DinoGameManager.course)
+        return CourseCursor(self, course)
+
+
+class CourseCursor:
+    # the position of a single game in its course
+    __slots__ = ('schedule', 'course', 'position')
+
+    def __init__(self, schedule, course):
+        # an init function for the course cursor class, receives the obstacle schedule and the index of the course
+        self.schedule = schedule
+        self.course = course
+        self.position = 0
+
+    def next(self):
+        # returns the kind and type of the next obstacle of the course
+        kinds, types = self.schedule.take(np.array([self.course]), np.array([self.position]))
+        self.position += 1
+        return int(kinds[0]), int(types[0])
+
+
+class CourseEvaluator:
+    # class that evaluates every genome on all the K courses of a generation and averages its scores
+    # the K games of a genome are an extra batch dimension: the population is simulated as n * K games of the
+    # vectorized engine (game j runs genome j // K on course j % K), so every frame is still a single
+    # batched forward pass, and the score of a genome is the mean of its K games (less luck in the fitness)
+    # it is used like ParallelEval.ParallelEvaluator, the trainer sets the returned scores on its generation
+
+    def __init__(self, n, schedule, net_shape, actv_f, out_f, mut_f, canv_size=(800, 600), path='assets', seed=None):
+        # an init function for the course evaluator class
+        # the function receives the number of genomes, the obstacle schedule (its number of courses is K),
+        # the shape of the network, the activation and mutation functions, the size of the canvas
+        # and the run seed (with a seed every frame uses the fixed delta time, see DinoGen)
+        self.n = n
+        self.courses = schedule.courses
+        self.gm = VecDinoGen(n * self.courses, seed=seed)
+        self.gm.init_games(canv_size=canv_size, path=path)
+        self.gm.init_net(DinoGameManager.IN_LEN, net_shape, actv_f, out_f, mut_f, setWeights=False)
+        self.gm.set_schedule(schedule)
+
+    def evaluate(self, nets, dt, gen=0):
+        # runs a whole generation of the passed networks on all the courses and returns the mean score of every genome
+        self.gm.set_params_single([np.repeat(w, self.courses, axis=0) for w in nets.weights],
+                                  [np.repeat(b, self.courses, axis=0) for b in nets.bias])
+        self.gm.gen = gen
+        self.gm.restart()
+        while self.gm.not_all_dead():
+            self.gm.single_frame(dt)
+        return self.gm.time.reshape(self.n, self.courses).mean(axis=1)
+
+    def close(self):
+        # nothing to free, the games run in this process
+        pass
@@ -1,8 +1,11 @@
-from kivy.graphics import Rectangle, Color
 import gc
+import os
 import random as rd
 from NetworkClasses import *
 from typing import List
+from Assets import AssetManifest, TextureAtlas
+from Profiling import StageTimer
+from Selection import Selection
 #
 
 class DinoGameManager:
@@ -17,36 +20,23 @@ class DinoGameManager:
     BIRD_HEIGHTS = [100, 65, 0] # all possible bird obstacle heights
     OUT_LEN = 4 # all possible outputs: duck,no_action,jump,unduck
     IN_LEN = 5 # all possible inputs: dist_x,dist_y,obst_height,ducking,jumping
+    NO_ACTION = 2 # the index of the action that doesn't do anything
 
     @staticmethod
     def Find_Dino_Images(path:str):
         # a static function receives a path string
-        # the function loads the asset pngs, creates and returns a dictionary with the asset path
-        # and the image size (dimensions)
-        from pathlib import Path
-        import re
-        from PIL import Image
-
-        p = Path(path)
-        images = {}
-        for path in p.iterdir():
-            if not path.is_dir():
-                continue
-            for x in path.iterdir():
-                x = str(x)
-                name = re.sub('[0-9]?\.png', '', re.sub('.*/.*/', '', x))
-                img = Image.open(x)
-                if name in images:
-                    images[name] += [{'path': x, 'size': (img.width, img.height)}]
-                else:
-                    images[name] = [{'path': x, 'size': (img.width, img.height)}]
-        return images
-
-    def __init__(self,canv_size=(800, 600),path='assets',img=None):
+        # the function returns a dictionary with the asset path and the image size (dimensions) of every asset png
+        # the dictionary is loaded once per process and shared by all the game managers (see the AssetManifest class)
+        return AssetManifest.load(path)
+
+    def __init__(self,canv_size=(800, 600),path='assets',img=None,rng=None):
         # an init function for the game manager class
         # the function creates or receives the dictionary with the paths to the game assets (pngs)
-        # the function also receives the size of the canvas
+        # the function also receives the size of the canvas and the random stream of the game
         self.time = 0 # current game time (also the score)
+        self.rng = rng # the random stream (numpy Generator) obstacles are drawn from, the random module if None
+        self.course = None # the shared obstacle course the obstacles are read from instead (see Courses.ObstacleSchedule)
+        self.recorder = None # records the game for a replay (see the Replay module), None if not recording
         self.mtime = 0 # tells the obstacles and the dino which animation frame to be on
         # this variable is in the backend class because the change affects the size and bounds of the dino and obstacle
         self.actions = [self.dino_unduck,self.dino_duck,self.dino_no_action,self.dino_jump] # an of possible actions
@@ -63,10 +53,28 @@ class DinoGameManager:
         self.obstacles:List[Obstacle] = [] # obstacles array
         self.canv_size = canv_size # the size of the canvas
 
+    @staticmethod
+    def draw_obstacle(rng=None):
+        # returns the random kind of the next obstacle (bird, small cactus, large cactus) and its random type
+        # the values are drawn from the passed random stream or from the random module if no stream is passed
+        if rng is None:
+            return rd.randint(0, 2), rd.randint(0, 2)
+        rand1, rand = rng.integers(0, 3, size=2)
+        return int(rand1), int(rand)
+
+    def next_obstacle(self):
+        # returns the kind and type of the next obstacle (and records it if the game is recorded)
+        if self.course is not None:
+            rand1, rand = self.course.next()
+        else:
+            rand1, rand = DinoGameManager.draw_obstacle(self.rng)
+        if self.recorder is not None:
+            self.recorder.record_spawn(rand1, rand)
+        return rand1, rand
+
     def spawn(self):
         # adds random obstacle object to spawn queue
-        rand1 = rd.randint(0, 2)
-        rand = rd.randint(0, 2)
+        rand1, rand = self.next_obstacle()
         o = None
         if rand1 == 0: # bird
             o = Obstacle((self.canv_size[0],DinoGameManager.BIRD_HEIGHTS[rand]),self.imgs['Bird'][0]['size'],'Bird',1)
@@ -81,6 +89,8 @@ class DinoGameManager:
         # updates all computational aspects of a single game
         if not self.dino.enabled:
             return
+        if self.recorder is not None:
+            self.recorder.record_frame(dt)
 
         self.updateMtime(DinoGameManager.MOD)
         self.time += dt*DinoGameManager.GAME_SPEED*2
@@ -113,6 +123,12 @@ class DinoGameManager:
             # self.inputs[5] = self.time # time
         return self.inputs
 
+    def take_action(self, idx):
+        # makes the dino take the action at the passed index (and records it if the game is recorded)
+        if self.recorder is not None:
+            self.recorder.record_action(idx)
+        self.actions[idx]()
+
     def dino_not_dead(self):
         # checks if the dino is not dead yet (returns boolean)
         return self.dino.enabled
@@ -140,6 +156,67 @@ class DinoGameManager:
         self.mtime = 0
         self.obstacles = []
         self.dino.reset()
+        if self.recorder is not None:
+            self.recorder.reset()
+
+class Sprites:
+    # class that loads the texture of every asset once per process (frontend)
+    # the visual classes set a preloaded texture on their rectangles instead of a file path
+    # so kivy doesn't resolve the image again when the sprite changes
+    # the textures are regions of the texture atlas of the assets directory (see Assets.TextureAtlas),
+    # so all the sprites share a single texture, pngs that aren't in the atlas are loaded on their own
+    CACHE = {} # png path -> kivy texture
+    ATLASES = {} # assets path -> (atlas texture, atlas index) or None if there is no atlas
+
+    @staticmethod
+    def texture(path):
+        # returns the texture of a png (loaded the first time it is asked for)
+        texture = Sprites.CACHE.get(path)
+        if texture is None:
+            texture = Sprites.CACHE[path] = Sprites.load(path)
+        return texture
+
+    @staticmethod
+    def load(path):
+        # returns the region of the atlas of a png or the texture of the png itself if it isn't in the atlas
+        folder = os.path.dirname(path)
+        assets = os.path.dirname(folder)
+        atlas = Sprites.atlas(assets)
+        rel = os.path.basename(folder) + '/' + os.path.basename(path)
+        if atlas is not None and rel in atlas[1]['regions']:
+            texture, index = atlas
+            x, y, w, h = index['regions'][rel]
+            return texture.get_region(x, index['size'][1] - y - h, w, h) # kivy measures y from the bottom
+        from kivy.core.image import Image as CoreImage
+        return CoreImage(path).texture
+
+    @staticmethod
+    def atlas(assets):
+        # returns the atlas texture and index of an assets directory (loaded once), None if there is no atlas
+        key = os.path.abspath(assets)
+        if key not in Sprites.ATLASES:
+            index = TextureAtlas.load(assets)
+            if index is None:
+                Sprites.ATLASES[key] = None
+            else:
+                from kivy.core.image import Image as CoreImage
+                texture = CoreImage(os.path.join(assets, TextureAtlas.IMAGE_FILENAME)).texture
+                Sprites.ATLASES[key] = (texture, index)
+        return Sprites.ATLASES[key]
+
+    @staticmethod
+    def preload(imgs):
+        # loads the textures of all the images in an asset dictionary (see DinoGameManager.Find_Dino_Images)
+        for images in imgs.values():
+            for image in images:
+                Sprites.texture(image['path'])
+
+    @staticmethod
+    def set(rect, image):
+        # sets the texture and size of an image of the asset dictionary on a rectangle
+        rect.texture = Sprites.texture(image['path'])
+        rect.size = image['size']
+
 
 class DinoGameVisManager:
     # class that manages the visual aspects of a single dino game (draws and updates the canvas), (frontend)
@@ -164,6 +241,11 @@ class DinoGameVisManager:
     def init_canvas(self):
         # initializes the objects that are drawn to the canvas
         # e.g. the dino image and the obstacle image (initialized as blank)
+        # kivy is imported here so the computational classes can be used without a window
+        from kivy.graphics import Rectangle
+
+        if self.gm is not None:
+            Sprites.preload(self.gm.imgs)
         with self.canvas:
             # visual
             dino = Rectangle()
@@ -193,6 +275,13 @@ class DinoGameVisManager:
         self.obstv.obst = self.gm.obstacles[-1]
         return True
 
+    def set_slot_game(self, gm:DinoGameManager):
+        # makes the visual game draw another game (the drawn obstacle is hidden until the next draw)
+        self.set_gm(gm)
+        self.set_dino()
+        self.obstv.obst = None
+        self.obstv.hide()
+
     def draw_all(self):
         # updates all visual aspects, calls the draw functions in the dino and obstacle classes
         if self.canvas is None or self.gm is None:
@@ -220,7 +309,7 @@ class DinoGameVisManager:
 
     def reset(self):
         # resets all needed variables in class for a new game
-        self.obstv.rect.pos = (-100,0)
+        self.obstv.hide()
         self.gm.reset()
 
 
@@ -310,6 +399,8 @@ class Dino:
         self.jumping = False  # Jumping or not
         self.ducking = False  # Ducking or not
 
+        self.size = self.psize[0] # current size
+        self.a = Dino.JUMP_ACC  # current acceleration
         self.v = 0  # speed
 
 class DinoVis:
@@ -321,25 +412,30 @@ class DinoVis:
         # and a dino object
         self.rect = rect
         self.dino:Dino = dino
+        self.sprite = None # the (image name, index) of the drawn sprite
+        self.pos = None # the drawn position
 
     def draw(self, gm: DinoGameManager, mt, vis:DinoGameVisManager):
         # draws dino or changes dino animation frame
         # the function receives a game manager object, the current animation frame and a visual game manager object
+        # the rectangle is only changed when the sprite or the position changed since the last draw
         if self.dino is None or self.rect is None:
             return
         if not self.dino.enabled:
-            self.rect.source = gm.imgs['DinoDead'][0]['path']
-            self.rect.size = gm.imgs['DinoDead'][0]['size']
+            sprite = ('DinoDead', 0)
         elif self.dino.ducking:  # ducking
-            self.rect.source = gm.imgs['DinoDuck'][mt]['path']
-            self.rect.size = gm.imgs['DinoDuck'][mt]['size']
+            sprite = ('DinoDuck', mt)
         elif self.dino.jumping:  # jumping
-            self.rect.source = gm.imgs['DinoJump'][0]['path']
-            self.rect.size = gm.imgs['DinoJump'][0]['size']
+            sprite = ('DinoJump', 0)
         else:  # running
-            self.rect.source = gm.imgs['DinoRun'][mt]['path']
-            self.rect.size = gm.imgs['DinoRun'][mt]['size']
-        self.rect.pos = (self.dino.x+vis.xoff, self.dino.y+vis.yoff)
+            sprite = ('DinoRun', mt)
+        if sprite != self.sprite:
+            Sprites.set(self.rect, gm.imgs[sprite[0]][sprite[1]])
+            self.sprite = sprite
+        pos = (self.dino.x+vis.xoff, self.dino.y+vis.yoff)
+        if pos != self.pos:
+            self.rect.pos = pos
+            self.pos = pos
 
 
 class Obstacle:
@@ -374,34 +470,57 @@ class ObstacleVis:
         # and an obstacle object
         self.rect = rect
         self.obst:Obstacle = obst
+        self.sprite = None # the (image name, index) of the drawn sprite
+        self.pos = None # the drawn position
 
     def draw(self, gm:DinoGameManager, mt, vis:DinoGameVisManager):
         # draws obstacle or changes obstacle animation frame
         # the function receives a game manager object, the current animation frame and a visual game manager object
+        # the rectangle is only changed when the sprite or the position changed since the last draw
         if self.obst is None or self.rect is None:
             return
         if self.obst.change:
-            self.rect.pos = (self.obst.x + vis.xoff, self.obst.y+Obstacle.BIRD_OFFSET*mt + vis.yoff)
-            self.rect.source = gm.imgs[self.obst.img][mt]['path']
-            self.rect.size = gm.imgs[self.obst.img][mt]['size']
+            sprite = (self.obst.img, mt)
+            pos = (self.obst.x + vis.xoff, self.obst.y+Obstacle.BIRD_OFFSET*mt + vis.yoff)
         else:
-            self.rect.source = gm.imgs[self.obst.img][self.obst.type]['path']
-            self.rect.size = gm.imgs[self.obst.img][self.obst.type]['size']
-            self.rect.pos = (self.obst.x + vis.xoff, self.obst.y + vis.yoff)
+            sprite = (self.obst.img, self.obst.type)
+            pos = (self.obst.x + vis.xoff, self.obst.y + vis.yoff)
+        if sprite != self.sprite:
+            Sprites.set(self.rect, gm.imgs[sprite[0]][sprite[1]])
+            self.sprite = sprite
+        if pos != self.pos:
+            self.rect.pos = pos
+            self.pos = pos
+
+    def hide(self):
+        # moves the obstacle out of the canvas
+        if self.rect is not None:
+            self.rect.pos = (-100,0)
+        self.pos = (-100,0)
 
 
 class DinoGen:
     # class that manages the computational aspect of generations in the game (backend)
-    def __init__(self,n,maxnotmin=True):  # passed to gen From Controller class
+    FIXED_DT = 0.01 # the delta time of every frame in deterministic mode
+
+    def __init__(self,n,maxnotmin=True,seed=None,offset=0,optimizer=None):  # passed to gen From Controller class
         # an init function for the DinoGen class
         # the function receives the number of players in each generation and a boolean value
         # when the boolean is true the maximum outputs of the neural network are taken
         # if false then the minimum values
+        # if a run seed is passed the games are deterministic: every frame uses a fixed delta time and every game
+        # draws its obstacles from its own random stream derived from (seed, generation, index of the game)
+        # the offset is the index of the first game in the whole population (when it is split between processes)
+        # if an evolution strategy is passed (see Evolution) it replaces the selection, crossover and mutation
         self.n = n
         self.maxnotmin = maxnotmin
+        self.seed = seed # the run seed, None for the wall clock delta time and the random module
+        self.offset = offset
 
         self.nets: Nets = None # a neural networks object
         self.games: List[DinoGameManager] = [] # all the game manager objects in single generation
+        self.alive = [] # the indexes of the games whose dinos are still alive (the only games that are stepped)
+        self.scores = np.zeros(n) # the score (game time) of every game, kept up to date for picking the best game
 
         self.output = None # the last values the neural network calculated
         self.out = None # the last actions picked by the neural network (index of action)
@@ -410,16 +529,64 @@ class DinoGen:
         self.bestPlayers = [] # an array of the best players in each generation
 
         self.gen = 0 # generation number
+        self.writer = None # saves the best player of every generation in the background (see Checkpoints.ArchiveWriter)
+        self.timer = StageTimer.DISABLED # times the simulation and inference stages of every frame
+        self.selection = Selection() # picks the parents and elites of the next generation (see Selection)
+        self.optimizer = optimizer # the evolution strategy that samples the generations (None for the genetic algorithm)
+        self.schedule = None # the shared obstacle courses of every generation (see Courses.ObstacleSchedule)
 
     def init_games(self,canv_size=(800, 600), path='assets', img=None):
-        # initializes the game managers
+        # initializes the game managers, all the game managers share the same asset dictionary
+        if img is None:
+            img = DinoGameManager.Find_Dino_Images(path)
         self.games = [DinoGameManager(canv_size=canv_size,path=path,img=img) for _ in range(self.n)]
+        self.alive = list(range(self.n))
+        self.scores = np.zeros(self.n)
+        self.seed_games()
+
+    def game_rng(self, i):
+        # returns the random stream of the ith game in the current generation (deterministic mode only)
+        return np.random.default_rng([self.seed, self.gen, self.offset + i])
+
+    def seed_games(self):
+        # gives every game its own random stream for the current generation (if there is a run seed)
+        # or its course of the current generation (if there is an obstacle schedule)
+        if self.schedule is not None:
+            self.schedule.generate(self.gen)
+            for i, game in enumerate(self.games):
+                game.course = self.schedule.cursor(self.schedule.course_of(self.offset + i))
+            return
+        for game in self.games:
+            game.course = None
+        if self.seed is None:
+            return
+        for i, game in enumerate(self.games):
+            game.rng = self.game_rng(i)
 
-    def init_net(self,inputLength, netShape, aFuncH, aFuncO, mut_func, setWeights=True):
+    def init_net(self,inputLength, netShape, aFuncH, aFuncO, mut_func, setWeights=True, crossover='uniform'):
         # initializes the neural networks
-        self.nets = Nets(self.n, inputLength, netShape, aFuncH, aFuncO, mut_func)
+        self.nets = Nets(self.n, inputLength, netShape, aFuncH, aFuncO, mut_func, crossover)
         if setWeights:
             self.nets.net_weights_init()
+            if self.optimizer is not None:
+                self.optimizer.init(self.nets)
+
+    def set_timer(self, timer):
+        # sets the stage timer the simulation and the inference of every frame are timed with
+        self.timer = timer
+
+    def set_selection(self, selection):
+        # sets the selection strategy the parents and the elites of the next generation are picked with
+        self.selection = selection
+
+    def set_schedule(self, schedule):
+        # sets the obstacle schedule the games read their obstacles from (None for every game drawing its own)
+        self.schedule = schedule
+        self.seed_games()
+
+    def set_writer(self, writer):
+        # sets the archive writer the best player of every generation is handed to in mutate (None to stop saving)
+        self.writer = writer
 
     def set_params_single(self,weights,biases):
         # sets the weights and biases of the networks
@@ -436,35 +603,52 @@ class DinoGen:
         return self.check_dead() > 0
 
     def check_dead(self):
-        # the function counts the number of active (dinos that are alive) games and returns it
-        count = 0
-        for game in self.games:
-            if game.dino_not_dead():
-                count += 1
-        return count
+        # the function returns the number of active (dinos that are alive) games
+        # (the living games are tracked every frame so nothing is counted)
+        return len(self.alive)
 
     def single_pass(self):
         # a single action pass for all the games
         # this function calculates the networks outputs and makes each game take the next action
+        # only the networks of the living dinos are calculated (dead dinos don't do actions),
+        # the last outputs of the dead dinos are left as they were
         if self.not_initialized():
             return
+        if self.out is None:
+            self.out = np.zeros((self.n, 1), dtype=int)
+            self.output = np.zeros((self.n, DinoGameManager.OUT_LEN, 1))
+        if len(self.alive) == 0:
+            return
 
-        inputs = np.zeros((self.n,self.nets.input_length,1))
+        inputs = np.zeros((len(self.alive),self.nets.input_length,1))
 
-        for idx,game in enumerate(self.games):
-            inputs[idx] = game.get_inputs()
+        for idx,i in enumerate(self.alive):
+            inputs[idx] = self.games[i].get_inputs()
 
-        self.out,self.output = self.nets.forward_pass(inputs,self.maxnotmin)
+        idxs = None if len(self.alive) == self.n else np.array(self.alive)
+        out, output = self.nets.forward_pass(inputs,self.maxnotmin,idxs)
+        self.out[self.alive] = out
+        self.output[self.alive] = output
 
-        for idx,game in enumerate(self.games): # automatically ignores dead dinos because dead dinos don't do actions
-            game.actions[self.out[idx,0]]()
+        for idx,i in enumerate(self.alive):
+            self.games[i].take_action(out[idx,0])
 
     def single_frame(self,dt):
         # runs a single game frame, meaning it runs a frame of the game manager and then picks an action for each dino
-        # receives the delta time from the last frame\update
-        for game in self.games:
-            game.updateAll(dt)
-        self.single_pass()
+        # receives the delta time from the last frame\update (ignored in deterministic mode)
+        if self.seed is not None:
+            dt = DinoGen.FIXED_DT
+        with self.timer.stage('simulation'):
+            alive = []
+            for i in self.alive:
+                game = self.games[i]
+                game.updateAll(dt)
+                self.scores[i] = game.time
+                if game.dino.enabled:
+                    alive.append(i)
+            self.alive = alive
+        with self.timer.stage('inference'):
+            self.single_pass()
 
     def run_games(self,dt):
         # runs all games in current generation until all dinos are dead
@@ -478,54 +662,328 @@ class DinoGen:
         print("all done")
 
     def mutate(self):
-        # function takes the best player or the two best players in the generation and calls the mutate
-        # and crossover function in the players nets
+        # function picks the parents (by default the best player or the two best players in the generation) and the
+        # elites with the selection strategy and calls the mutate and crossover function in the players nets
+        # (with an evolution strategy the strategy samples the next generation instead)
         # and remembers the best net and score of the generation
-        self.bestPlayers += [(self.games[self.best[-1]].time,*self.nets.get_ith_net(self.best[-1]))]
-        if len(self.best) > 1:
-            self.nets.mutate([self.best[-1],self.best[-2]])
+        self.bestPlayers += [(self.get_score(self.best[-1]),*self.nets.get_ith_net(self.best[-1]))]
+        if self.writer is not None:
+            self.writer.put(self.bestPlayers[-1])
+        if self.optimizer is not None:
+            self.optimizer.step(self.nets, self.scores)
         else:
-            self.nets.mutate([self.best[-1]])
+            self.nets.mutate(self.selection.parents(self.scores, self.best), self.selection.elites(self.scores))
         self.gen += 1
+        if self.writer is not None:
+            self.writer.put_state(self.nets.weights, self.nets.bias, self.get_state())
 
     def restart(self):
         # the function restarts all the games
         for game in self.games:
             game.reset()
+        self.alive = list(range(self.n))
+        self.scores = np.zeros(self.n)
+        self.seed_games()
+
+    def get_score(self, i):
+        # returns the score (game time) of the ith game
+        return self.games[i].time
+
+    def get_state(self):
+        # returns the training state that isn't in the networks as a json serializable dictionary
+        # (the generation, the best players lineage, the run seed and the states of both random generators)
+        np_state = np.random.get_state()
+        state = {'gen': self.gen, 'best': [int(i) for i in self.best], 'seed': self.seed,
+                 'random': [rd.getstate()[0], list(rd.getstate()[1]), rd.getstate()[2]],
+                 'numpy_random': [np_state[0], np_state[1].tolist(), *np_state[2:]]}
+        if self.optimizer is not None:
+            state['optimizer'] = self.optimizer.get_state()
+        return state
+
+    def set_state(self, state):
+        # sets the training state to a state returned by get_state
+        self.gen = state['gen']
+        self.best = list(state['best'])
+        version, internal, gauss = state['random']
+        rd.setstate((version, tuple(internal), gauss))
+        name, keys, *rest = state['numpy_random']
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), *rest))
+        if self.optimizer is not None:
+            if 'optimizer' not in state:
+                raise ValueError("the saved run wasn't trained with an evolution strategy")
+            self.optimizer.set_state(state['optimizer'])
+
+    def resume(self, path):
+        # continues the training from the latest population saved in an archive directory
+        # (see Checkpoints.ArchiveWriter, the population has to be saved) with the same random states
+        # the networks have to be initialized and the population size and the run seed have to match the saved run
+        from Checkpoints import PlayerArchive
+
+        archive = PlayerArchive.open(path)
+        if archive.net_shape != [tuple(l) for l in self.nets.net_shape]:
+            raise ValueError(f"the archive {path} has networks of a different shape")
+        weights, bias, state = archive.load_state()
+        if len(weights[0]) != self.n:
+            raise ValueError(f"the saved population has {len(weights[0])} players, not {self.n}")
+        if state['seed'] != self.seed:
+            raise ValueError(f"the saved run has the seed {state['seed']}, not {self.seed}")
+        if len(archive) < state['gen']:
+            raise ValueError(f"the archive {path} is missing best players of the saved generations")
+
+        self.nets.set_variables(weights, bias)
+        self.set_state(state)
+        self.bestPlayers = [archive[i] for i in range(self.gen)]
+        self.restart()
+
+    def set_scores(self, scores):
+        # sets the score (game time) of every game, used when the games were evaluated somewhere else
+        for game, score in zip(self.games, scores):
+            game.time = float(score)
+        self.scores[:] = scores
+
+    def replay_best(self) -> int:
+        # the function adds the best players the current generation had while it was played to the best players list
+        # and returns the best players index, for games that were evaluated somewhere else (see set_scores)
+        # every living dino gains the same score in a frame so the best player of a frame is always the first of the
+        # games that are still alive: going over the final scores from the lowest, the best player after the games
+        # of every score died is the first of the games that scored more (the same list return_best builds per frame)
+        levels, level = np.unique(self.scores, return_inverse=True)
+        first = np.full(len(levels), self.n)
+        np.minimum.at(first, level, np.arange(self.n))
+        return self.add_best(np.minimum.accumulate(first[::-1])[::-1])
+
+    def add_best(self, idxs) -> int:
+        # the function adds the passed players (from the worst to the best) to the end of the best players list
+        # in the current generation (a player isn't added twice in a row) and returns the last one
+        for best_gm in idxs:
+            if self.best[-1] != best_gm:
+                self.best += [int(best_gm)]
+        return self.best[-1]
 
     def return_best(self) -> int:
-        # the function returns the best players index in the current generation
+        # the function returns the best players index in the current generation (the first of equal scores)
         # if it's a new best player it adds it to the end of the best players list in the current generation
-        best_gm: int = 0
-        for i in range(self.n):
-            if self.games[best_gm].time < self.games[i].time:
-                best_gm = i
+        best_gm = int(np.argmax(self.scores))
         if self.best[-1] != best_gm:
             self.best += [best_gm]
         return best_gm
 
+    def record_replays(self):
+        # starts recording every game so the replay of any game can be taken with get_replay
+        from Replay import ReplayRecorder
+
+        for game in self.games:
+            game.recorder = ReplayRecorder()
+
+    def get_replay(self, i):
+        # returns the replay of the ith game in the current generation (the games have to be recorded)
+        game = self.games[i]
+        return game.recorder.to_replay(canv_size=game.canv_size, score=game.time, seed=self.seed, gen=self.gen,
+                                       index=self.offset + i)
+
+    def get_game_inputs(self, i):
+        # returns the last inputs the network of the ith game received
+        return self.games[i].inputs
+
     def get_best_players(self):
         # returns the best players in the whole training period (all the generations)
         return self.bestPlayers
 
 class DinoGenVis:
     # class that manages the visual aspect of generations in the game (frontend)
-    def __init__(self,n,canvas):
+    # only a few games are drawn: there are canvas instructions for K slots and every slot draws a game,
+    # the slots are handed to other living games when their games die (the dead games stay drawn until their
+    # slot is needed) so the cost of drawing doesn't depend on the number of players
+    # one game (e.g. the best game) can be drawn at a different offset and always has a slot
+    SLOTS = 10 # the default number of drawn games
+
+    def __init__(self,n,canvas,slots=None):
         # an init function for the DinoGenVis class
-        # receives a canvas object and the number of players in the generation
+        # receives a canvas object, the number of players in the generation and the number of drawn games
         self.n = n
+        self.slots = min(n, slots or DinoGenVis.SLOTS)
 
         self.canvas = canvas
+        self.gen: DinoGen = None # the drawn generation
+        self.yoff = 0 # the y offset of the drawn games
 
-        self.vis_games: List[DinoGameVisManager] = [] # an array of visual game managers
+        self.vis_games: List[DinoGameVisManager] = [] # an array of visual game managers (one for every slot)
+        self.slot_games = [] # the index of the game drawn in every slot (None for an empty slot)
+        self.best = None # the index of the game drawn at a different offset
+        self.best_yoff = 0 # the y offset of that game
 
     def init_games(self,xoff,yoff,gen_obj:DinoGen):
-        # initializes all the visual game managers
-        self.vis_games = [DinoGameVisManager(xoff,yoff,self.canvas, gen_obj.games[i]) for i in range(self.n)]
+        # initializes the visual game managers of all the slots
+        self.gen = gen_obj
+        self.yoff = yoff
+        Sprites.preload(gen_obj.games[0].imgs)
+        self.vis_games = [DinoGameVisManager(xoff,yoff,self.canvas) for _ in range(self.slots)]
+        self.slot_games = [None] * self.slots
+        self.assign_slots()
+
+    def set_best(self, i, yoff):
+        # draws the ith game at the passed y offset (None to draw all the games at the same offset)
+        self.best = i
+        self.best_yoff = yoff
+
+    def assign_slots(self):
+        # hands the slots of games that died (or empty slots) to the best living games that aren't drawn
+        gen = self.gen
+        keep = {g for g in self.slot_games if g is not None and (gen.games[g].dino.enabled or g == self.best)}
+        wanted = [] if self.best is None or self.best in keep else [self.best]
+
+        free = self.slots - len(keep) - len(wanted)
+        alive = np.asarray(gen.alive, dtype=int)
+        if free > 0 and len(alive) > 0:
+            # the best scoring living games, a few more than needed so the drawn ones can be skipped
+            m = min(len(alive), free + len(keep) + 1)
+            if m < len(alive):
+                alive = alive[np.argpartition(-gen.scores[alive], m - 1)[:m]]
+            for g in alive[np.argsort(-gen.scores[alive], kind='stable')]:
+                if len(wanted) >= self.slots - len(keep):
+                    break
+                if g not in keep and g != self.best:
+                    wanted.append(int(g))
+
+        for g in wanted:
+            slot = next((s for s, d in enumerate(self.slot_games) if d is None), None)
+            if slot is None:
+                slot = next((s for s, d in enumerate(self.slot_games) if d not in keep), None)
+            if slot is None: # every slot draws a living game, the best game takes the last one
+                slot = self.slots - 1
+                keep.discard(self.slot_games[slot])
+            self.set_slot(slot, g)
+            keep.add(g)
+
+    def set_slot(self, slot, i):
+        # makes the slot draw the ith game
+        self.vis_games[slot].set_slot_game(self.gen.games[i])
+        self.slot_games[slot] = i
 
     def single_frame(self):
-        # draws a single frame of all the games
-        for vis_game in self.vis_games:
+        # draws a single frame of the drawn games
+        self.assign_slots()
+        for vis_game, g in zip(self.vis_games, self.slot_games):
+            if g is None:
+                continue
+            vis_game.yoff = self.best_yoff if g == self.best else self.yoff
             vis_game.draw_all()
 
 
+class BatchedGenVis:
+    # class that draws all the games of a generation with a single kivy mesh (frontend)
+    # every dino and every obstacle is a textured quad of the texture atlas (see Assets.TextureAtlas)
+    # and the vertices of all the quads are written with a few numpy operations straight from the state arrays
+    # of a vectorized generation (VecDinoGen.vis_state) into a float32 buffer the meshes read without a copy
+    # to a python list, so there is one draw call and no python loop over the games for the whole population
+    # it has the same functions as the DinoGenVis class and works only if all the sprites are in the atlas
+    MAX_QUADS = 16384 # kivy meshes index their vertices with 16 bit indexes, more quads are split between meshes
+    DINO_SPRITES = [('DinoDead', 0), ('DinoDuck', 0), ('DinoDuck', 1), ('DinoJump', 0), ('DinoRun', 0), ('DinoRun', 1)]
+    OBSTACLE_SPRITES = [('Bird', 0), ('Bird', 1), ('SmallCactus', 0), ('SmallCactus', 1), ('SmallCactus', 2),
+                        ('LargeCactus', 0), ('LargeCactus', 1), ('LargeCactus', 2)]
+    # the sprite ids of the first sprite of every dino state and obstacle kind
+    DEAD, DUCK, JUMP, RUN = 0, 1, 3, 4
+    BIRD, SMALL_CACTUS, LARGE_CACTUS = 6, 8, 11
+    EMPTY = 14 # an empty quad (a game without an obstacle)
+    KIND_BIRD, KIND_SMALL_CACTUS = 0, 1 # the obstacle kinds of VecDinoGen.vis_state
+
+    def __init__(self,n,canvas):
+        # an init function for the BatchedGenVis class
+        # receives a canvas object and the number of players in the generation
+        self.n = n
+        self.canvas = canvas
+        self.gen = None # the drawn generation (a VecDinoGen)
+        self.xoff = 0
+        self.yoff = 0
+        self.best = None # the index of the game drawn at a different offset
+        self.best_yoff = 0
+
+        self.meshes = [] # the kivy meshes (one for every MAX_QUADS quads)
+        self.tex_coords = None # the texture coordinates of the 4 corners of every sprite (sprites x 8)
+        self.sizes = None # the size of every sprite (sprites x 2)
+        self.vertices = None # the float32 vertex buffer of all the quads (quads x 4 corners x (x, y, u, v))
+
+    @staticmethod
+    def sprites():
+        # returns the (image name, index) of every sprite in the order of the sprite ids
+        return BatchedGenVis.DINO_SPRITES + BatchedGenVis.OBSTACLE_SPRITES
+
+    @staticmethod
+    def supported(imgs):
+        # returns true if all the sprites of the asset dictionary are in the texture atlas
+        path = imgs['DinoRun'][0]['path']
+        assets = os.path.dirname(os.path.dirname(path))
+        atlas = Sprites.atlas(assets)
+        if atlas is None:
+            return False
+        for name, i in BatchedGenVis.sprites():
+            path = imgs[name][i]['path']
+            if os.path.basename(os.path.dirname(path)) + '/' + os.path.basename(path) not in atlas[1]['regions']:
+                return False
+        return True
+
+    def init_games(self,xoff,yoff,gen_obj):
+        # creates the meshes and the sprite tables of the generation (a VecDinoGen)
+        from kivy.graphics import Mesh
+
+        self.gen = gen_obj
+        self.xoff = xoff
+        self.yoff = yoff
+        imgs = gen_obj.imgs
+
+        sprites = BatchedGenVis.sprites()
+        self.tex_coords = np.zeros((len(sprites) + 1, 8))
+        self.sizes = np.zeros((len(sprites) + 1, 2)) # the empty sprite has no size
+        for i, (name, idx) in enumerate(sprites):
+            self.tex_coords[i] = Sprites.texture(imgs[name][idx]['path']).tex_coords
+            self.sizes[i] = imgs[name][idx]['size']
+        texture = Sprites.atlas(os.path.dirname(os.path.dirname(imgs['DinoRun'][0]['path'])))[0]
+
+        quads = 2 * self.n # a dino and an obstacle for every game
+        self.vertices = np.zeros((quads, 4, 4), dtype=np.float32)
+        self.meshes = []
+        with self.canvas:
+            for start in range(0, quads, BatchedGenVis.MAX_QUADS):
+                count = min(BatchedGenVis.MAX_QUADS, quads - start)
+                indices = (np.arange(count)[:, np.newaxis] * 4 + [0, 1, 2, 2, 3, 0]).ravel().tolist()
+                self.meshes.append(Mesh(vertices=[], indices=indices, mode='triangles', texture=texture))
+
+    def set_best(self, i, yoff):
+        # draws the ith game at the passed y offset (None to draw all the games at the same offset)
+        self.best = i
+        self.best_yoff = yoff
+
+    def single_frame(self):
+        # draws a single frame of all the games
+        x, y, alive, ducking, jumping, mt, has_obst, ox, oy, okind, otype = self.gen.vis_state()
+        dino = np.where(~alive, BatchedGenVis.DEAD,
+                        np.where(ducking, BatchedGenVis.DUCK + mt, np.where(jumping, BatchedGenVis.JUMP,
+                                                                           BatchedGenVis.RUN + mt)))
+        bird = okind == BatchedGenVis.KIND_BIRD
+        obst = np.where(bird, BatchedGenVis.BIRD + mt,
+                        np.where(okind == BatchedGenVis.KIND_SMALL_CACTUS, BatchedGenVis.SMALL_CACTUS + otype,
+                                 BatchedGenVis.LARGE_CACTUS + otype))
+        obst = np.where(has_obst, obst, BatchedGenVis.EMPTY)
+
+        yoff = np.full(self.n, float(self.yoff))
+        if self.best is not None:
+            yoff[self.best] = self.best_yoff
+        pos = np.concatenate((np.stack((x + self.xoff, y + yoff), axis=1),
+                              np.stack((ox + self.xoff, oy + Obstacle.BIRD_OFFSET * mt * bird + yoff), axis=1)))
+        self.write(pos, np.concatenate((dino, obst)))
+
+    def write(self, pos, ids):
+        # writes the quads of the passed sprites at the passed positions (bottom left corners) to the meshes
+        size = self.sizes[ids]
+        v = self.vertices
+        v[:, :, 0] = pos[:, 0:1] # x of the corners: bottom left, bottom right, top right, top left
+        v[:, 1:3, 0] += size[:, 0:1]
+        v[:, :, 1] = pos[:, 1:2] # y of the corners
+        v[:, 2:4, 1] += size[:, 1:2]
+        v[:, :, 2:4] = self.tex_coords[ids].reshape(-1, 4, 2)
+
+        flat = v.reshape(-1)
+        for i, mesh in enumerate(self.meshes):
+            start = i * BatchedGenVis.MAX_QUADS * 16
+            mesh.vertices = memoryview(flat[start:start + BatchedGenVis.MAX_QUADS * 16])
+
@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class EvolutionStrategy(ABC):
+    # base class of the evolution strategies that can replace the crossover and mutation of the networks
+    # (see DinoGen, the strategy is passed when the generation is constructed)
+    # a strategy keeps a search distribution over the flat parameter vector of a single network (Nets.get_flat)
+    # and every generation is a sample of it: the first network is always the mean of the distribution and the
+    # others are the mean plus noise, so the whole generation is still evaluated by the batched forward pass
+    # after the games the scores of the samples update the distribution and a new generation is sampled
+    # the first generation is the normal random population and the search starts from its best network
+    # (a random mean usually dies at the first obstacle with all its samples and then there is nothing to follow)
+    # the noise of every sample is recovered from its parameters so nothing but the distribution has to be kept
+    # all the random numbers are drawn from numpy.random (deterministic with a run seed)
+    # a strategy implements noise and update (and extends reset, get_state and set_state with its own state)
+    NAMES = {} # name -> strategy class, filled below the classes
+
+    def __init__(self, sigma):
+        # an init function for the evolution strategy class
+        # the function receives the initial standard deviation of the noise
+        self.sigma = sigma
+        self.mean = None # the mean of the search distribution (a flat network)
+
+    @staticmethod
+    def create(name, **params):
+        # returns a new strategy of the passed name
+        if name not in EvolutionStrategy.NAMES:
+            raise ValueError(f"unknown evolution strategy: {name}, possible: {tuple(EvolutionStrategy.NAMES)}")
+        return EvolutionStrategy.NAMES[name](**params)
+
+    def init(self, nets):
+        # prepares the strategy for the passed (randomly initialized) networks, the first generation is left as it is
+        if nets.n < 3:
+            raise ValueError("an evolution strategy needs at least 3 networks (the mean and two samples)")
+        self.mean = None
+        self.reset(nets.get_flat().shape[1])
+
+    def reset(self, dim):
+        # initializes the state of the strategy for the passed number of parameters
+        pass
+
+    def sample(self, nets):
+        # replaces the networks with a new generation: the mean and the mean plus the noise of every sample
+        noise = self.noise(nets.n - 1, len(self.mean))
+        nets.set_flat(np.concatenate((self.mean[np.newaxis], self.mean + self.sigma * noise)))
+
+    def step(self, nets, scores):
+        # updates the distribution with the scores of the current generation and samples the next one
+        # (after the first generation the mean is set to its best network)
+        if self.mean is None:
+            self.mean = nets.get_flat()[int(np.argmax(scores))].copy()
+            self.sample(nets)
+            return
+        noise = (nets.get_flat()[1:] - self.mean) / self.sigma
+        self.update(noise, np.asarray(scores[1:], dtype=np.float64))
+        self.sample(nets)
+
+    @abstractmethod
+    def noise(self, samples, dim):
+        # returns the noise of the samples of a new generation (samples x parameters)
+        pass
+
+    @abstractmethod
+    def update(self, noise, scores):
+        # updates the distribution with the noise and the score of every sample
+        pass
+
+    def get_state(self):
+        # returns the state of the distribution as a json serializable dictionary (saved with the training state)
+        return {'sigma': self.sigma, 'mean': None if self.mean is None else self.mean.tolist()}
+
+    def set_state(self, state):
+        # sets the state of the distribution to a state returned by get_state
+        self.sigma = state['sigma']
+        self.mean = None if state['mean'] is None else np.array(state['mean'])
+
+    @staticmethod
+    def centered_ranks(scores):
+        # returns the ranks of the scores scaled to [-0.5, 0.5], equal scores get the same (average) rank
+        # (many dinos die at the same obstacle so ties are common and shouldn't push the mean anywhere)
+        values, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+        ranks = (np.cumsum(counts) - counts + (counts - 1) / 2)[inverse]
+        return ranks / max(len(scores) - 1, 1) - 0.5
+
+
+class OpenAIES(EvolutionStrategy):
+    # the evolution strategy of Salimans et al. 2017: the gradient of the expected score is estimated from
+    # mirrored samples (every noise vector is also used negated) weighted by their centered ranks,
+    # and the mean follows it with the adam optimizer and a small weight decay
+
+    def __init__(self, sigma=0.3, lr=0.05, weight_decay=0.005, beta1=0.9, beta2=0.999):
+        # an init function for the openai es class
+        # the function receives the standard deviation of the noise, the learning rate, the weight decay
+        # and the decay rates of the adam moments
+        super().__init__(sigma)
+        self.lr = lr
+        self.weight_decay = weight_decay
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.m = None # the first moment of adam
+        self.v = None # the second moment of adam
+        self.t = 0 # the number of updates
+
+    def reset(self, dim):
+        # extended function that starts with empty adam moments
+        self.m = np.zeros(dim)
+        self.v = np.zeros(dim)
+        self.t = 0
+
+    def noise(self, samples, dim):
+        # extended function that samples mirrored noise (the second half is the first half negated)
+        half = np.random.standard_normal(((samples + 1) // 2, dim))
+        return np.concatenate((half, -half))[:samples]
+
+    def update(self, noise, scores):
+        # extended function that estimates the gradient from the centered ranks and takes an adam step
+        grad = EvolutionStrategy.centered_ranks(scores) @ noise / (len(scores) * self.sigma)
+        grad -= self.weight_decay * self.mean
+
+        self.t += 1
+        self.m = self.beta1 * self.m + (1 - self.beta1) * grad
+        self.v = self.beta2 * self.v + (1 - self.beta2) * grad ** 2
+        m_hat = self.m / (1 - self.beta1 ** self.t)
+        v_hat = self.v / (1 - self.beta2 ** self.t)
+        self.mean = self.mean + self.lr * m_hat / (np.sqrt(v_hat) + 1e-8)
+
+    def get_state(self):
+        # extended function that also saves the state of the adam moments
+        return {**super().get_state(), 'm': self.m.tolist(), 'v': self.v.tolist(), 't': self.t}
+
+    def set_state(self, state):
+        # extended function that also sets the adam moments
+        super().set_state(state)
+        self.m = np.array(state['m'])
+        self.v = np.array(state['v'])
+        self.t = state['t']
+
+
+class DiagonalCMAES(EvolutionStrategy):
+    # the separable cma-es of Ros and Hansen 2008: a cma-es with a diagonal covariance matrix so every update is
+    # linear in the number of parameters, the step size follows the cumulative path length control
+    # and the variances are adapted from the evolution path and the best half of the samples
+
+    def __init__(self, sigma=0.5):
+        # an init function for the diagonal cma-es class
+        # the function receives the initial step size
+        super().__init__(sigma)
+        self.samples = None # the number of samples the weights and learning rates were set for
+        self.c = None # the diagonal of the covariance matrix
+        self.p_sigma = None # the evolution path of the step size
+        self.p_c = None # the evolution path of the covariance
+        self.t = 0 # the number of updates
+
+    def reset(self, dim):
+        # extended function that starts with the unit covariance and empty evolution paths
+        self.samples = None
+        self.c = np.ones(dim)
+        self.p_sigma = np.zeros(dim)
+        self.p_c = np.zeros(dim)
+        self.t = 0
+
+    def set_weights(self, samples, dim):
+        # sets the recombination weights and the learning rates for the passed number of samples and parameters
+        # (only when the number of samples changed)
+        if self.samples == samples:
+            return
+        self.samples = samples
+        self.mu = samples // 2
+        weights = np.log((samples + 1) / 2) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1 / np.sum(self.weights ** 2)
+
+        self.c_sigma = (self.mu_eff + 2) / (dim + self.mu_eff + 5)
+        self.d_sigma = 1 + 2 * max(0.0, np.sqrt((self.mu_eff - 1) / (dim + 1)) - 1) + self.c_sigma
+        self.c_c = (4 + self.mu_eff / dim) / (dim + 4 + 2 * self.mu_eff / dim)
+        # the covariance learning rates of the full cma-es, faster because only the diagonal is learned
+        c_1 = 2 / ((dim + 1.3) ** 2 + self.mu_eff)
+        c_mu = min(1 - c_1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((dim + 2) ** 2 + self.mu_eff))
+        scale = (dim + 2) / 3
+        self.c_1 = min(1.0, c_1 * scale)
+        self.c_mu = min(1 - self.c_1, c_mu * scale)
+        self.chi_n = np.sqrt(dim) * (1 - 1 / (4 * dim) + 1 / (21 * dim ** 2)) # the expected length of N(0, I)
+
+    def noise(self, samples, dim):
+        # extended function that samples the noise from the diagonal covariance
+        self.set_weights(samples, dim)
+        return np.sqrt(self.c) * np.random.standard_normal((samples, dim))
+
+    def update(self, noise, scores):
+        # extended function that moves the mean to the weighted best half of the samples and adapts the step size
+        # and the variances
+        dim = len(self.mean)
+        self.set_weights(len(scores), dim)
+        best = np.argsort(-scores, kind='stable')[:self.mu]
+        y = noise[best]
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        self.t += 1
+        self.p_sigma = ((1 - self.c_sigma) * self.p_sigma
+                        + np.sqrt(self.c_sigma * (2 - self.c_sigma) * self.mu_eff) * y_w / np.sqrt(self.c))
+        norm = np.linalg.norm(self.p_sigma)
+        h_sigma = norm / np.sqrt(1 - (1 - self.c_sigma) ** (2 * self.t)) < (1.4 + 2 / (dim + 1)) * self.chi_n
+        self.p_c = (1 - self.c_c) * self.p_c + h_sigma * np.sqrt(self.c_c * (2 - self.c_c) * self.mu_eff) * y_w
+
+        self.c = ((1 - self.c_1 - self.c_mu) * self.c
+                  + self.c_1 * (self.p_c ** 2 + (1 - h_sigma) * self.c_c * (2 - self.c_c) * self.c)
+                  + self.c_mu * self.weights @ y ** 2)
+        self.sigma *= np.exp(self.c_sigma / self.d_sigma * (norm / self.chi_n - 1))
+
+    def get_state(self):
+        # extended function that also saves the state of the covariance and the evolution paths
+        return {**super().get_state(), 'c': self.c.tolist(), 'p_sigma': self.p_sigma.tolist(),
+                'p_c': self.p_c.tolist(), 't': self.t}
+
+    def set_state(self, state):
+        # extended function that also sets the covariance and the evolution paths
+        super().set_state(state)
+        self.c = np.array(state['c'])
+        self.p_sigma = np.array(state['p_sigma'])
+        self.p_c = np.array(state['p_c'])
+        self.t = state['t']
+
+
+EvolutionStrategy.NAMES = {'openai_es': OpenAIES, 'cma_es': DiagonalCMAES}
@@ -1,29 +1,187 @@
-
-import matplotlib.pyplot as plt
-from IPython import display
-
-class Graph:
-    # utilities class that has static functions for displaying and clearing graph
-
-    plt.ion()
-    @staticmethod
-    def plot(scores):
-        # function that displays a graph of the inputted scores
-        display.clear_output(wait=True)
-        display.display(plt.gcf())
-        plt.clf()
-        plt.title('Training...')
-        plt.xlabel('Number of Games')
-        plt.ylabel('Score')
-        plt.plot(scores)
-        plt.ylim(ymin=0)
-        # plt.xticks(range(len(scores)))
-        plt.text(len(scores)-1, scores[-1], str(scores[-1]))
-        plt.show(block=False)
-        plt.pause(.1)
-
-    @staticmethod
-    def remove_out():
-        # clears the drawn graph
-        display.clear_output()
-        plt.close()
+import os
+import queue
+import threading
+import time as t
+
+
+class Graph:
+    # utilities class that has static functions for displaying and clearing the graph of the training scores
+    # the graph is drawn by one of three backends (picked with set_mode or the DINO_GRAPH environment variable):
+    # 'window' - an interactive matplotlib window, the line is updated in place and the window is redrawn
+    #            at most every MIN_INTERVAL seconds without pausing the training loop
+    # 'file' - the graph is saved as an image by a background thread (only the newest scores are drawn)
+    # 'off' - nothing is drawn and matplotlib isn't even imported (headless training)
+    # only the scores added since the last call are appended and long histories are downsampled to at most
+    # MAX_POINTS points, every point is the best score of a bucket of generations so peaks aren't lost
+    MODES = ('window', 'file', 'off')
+    MAX_POINTS = 1000 # the maximum number of points drawn
+    MIN_INTERVAL = 0.5 # the minimum number of seconds between redraws of the window
+    DEFAULT_FILENAME = 'training.png'
+
+    mode = os.environ.get('DINO_GRAPH', 'window')
+    filename = DEFAULT_FILENAME
+
+    # the downsampled score history
+    xs = [] # the first generation of every bucket
+    ys = [] # the best score of every bucket
+    count = 0 # the number of scores received
+    last = 0 # the last score received
+    stride = 1 # the number of generations in a bucket
+
+    # window backend
+    fig = None
+    line = None
+    text = None
+    last_draw = 0.0
+
+    # file backend
+    requests: queue.Queue = None # the newest history waiting to be drawn (one at most)
+    worker: threading.Thread = None
+    error: Exception = None # the error the background thread stopped on (raised on the main thread)
+
+    @staticmethod
+    def set_mode(mode, filename=DEFAULT_FILENAME):
+        # picks the backend that draws the graph ('window', 'file' or 'off') and the image file of the file backend
+        if mode not in Graph.MODES:
+            raise ValueError(f"unknown graph mode: {mode}")
+        Graph.remove_out()
+        Graph.mode = mode
+        Graph.filename = filename
+
+    @staticmethod
+    def plot(scores):
+        # function that displays a graph of the inputted scores (the scores of all the generations so far)
+        if Graph.mode == 'off' or len(scores) == 0:
+            return
+        if len(scores) < Graph.count: # a new training started
+            Graph.reset()
+        for score in scores[Graph.count:]:
+            Graph.add(score)
+
+        if Graph.mode == 'file':
+            Graph.draw_file()
+        elif t.time() - Graph.last_draw >= Graph.MIN_INTERVAL:
+            Graph.draw_window()
+
+    @staticmethod
+    def add(score):
+        # appends a score to the downsampled history, when there are too many points the buckets are merged in pairs
+        if Graph.count % Graph.stride == 0:
+            Graph.xs.append(Graph.count)
+            Graph.ys.append(score)
+        else:
+            Graph.ys[-1] = max(Graph.ys[-1], score)
+        Graph.count += 1
+        Graph.last = score
+
+        if len(Graph.xs) > Graph.MAX_POINTS:
+            Graph.stride *= 2
+            Graph.xs = Graph.xs[::2]
+            Graph.ys = [max(Graph.ys[i:i + 2]) for i in range(0, len(Graph.ys), 2)]
+
+    @staticmethod
+    def reset():
+        # forgets the score history
+        Graph.xs = []
+        Graph.ys = []
+        Graph.count = 0
+        Graph.last = 0
+        Graph.stride = 1
+
+    @staticmethod
+    def snapshot():
+        # returns a copy of the history that can be drawn on another thread
+        return list(Graph.xs), list(Graph.ys), Graph.count, Graph.last
+
+    @staticmethod
+    def style(ax, xs, ys, count, last):
+        # sets the titles and limits of the axes of a history
+        ax.set_title('Training...')
+        ax.set_xlabel('Number of Games')
+        ax.set_ylabel('Score')
+        ax.set_xlim(0, max(count - 1, 1))
+        ax.set_ylim(0, max(max(ys), last, 1) * 1.1)
+
+    @staticmethod
+    def draw_window():
+        # updates the line of the interactive window in place and lets the window redraw itself
+        import matplotlib.pyplot as plt
+
+        if Graph.fig is None or not plt.fignum_exists(Graph.fig.number):
+            plt.ion()
+            Graph.fig, ax = plt.subplots()
+            Graph.line, = ax.plot([], [])
+            Graph.text = ax.text(0, 0, '')
+            plt.show(block=False)
+
+        xs, ys, count, last = Graph.snapshot()
+        Graph.line.set_data(xs, ys)
+        Graph.text.set_position((count - 1, last))
+        Graph.text.set_text(str(last))
+        Graph.style(Graph.fig.axes[0], xs, ys, count, last)
+        Graph.fig.canvas.draw_idle()
+        Graph.fig.canvas.flush_events()
+        Graph.last_draw = t.time()
+
+    @staticmethod
+    def draw_file():
+        # hands the newest history to the background thread that saves the graph (an older waiting one is dropped)
+        # raises the error the background thread stopped on, if it failed
+        if Graph.worker is not None and not Graph.worker.is_alive():
+            Graph.remove_out()
+        if Graph.worker is None:
+            Graph.requests = queue.Queue(maxsize=1)
+            Graph.worker = threading.Thread(target=Graph.run_file, args=(Graph.requests, Graph.filename), daemon=True)
+            Graph.worker.start()
+        try:
+            Graph.requests.get_nowait()
+        except queue.Empty:
+            pass
+        Graph.requests.put(Graph.snapshot())
+
+    @staticmethod
+    def run_file(requests, filename):
+        # the background thread of the file backend, saves every history it receives until None is received
+        # (it uses its own figure without pyplot so it doesn't touch the window of the main thread)
+        # an error stops the thread and is kept in Graph.error for the main thread
+        try:
+            from matplotlib.figure import Figure
+
+            while (history := requests.get()) is not None:
+                xs, ys, count, last = history
+                fig = Figure()
+                ax = fig.subplots()
+                ax.plot(xs, ys)
+                ax.text(count - 1, last, str(last))
+                Graph.style(ax, xs, ys, count, last)
+                root, ext = os.path.splitext(filename)
+                tmp = f"{root}.tmp{ext}" # the image is replaced at once so a viewer never sees half of it
+                fig.savefig(tmp)
+                os.replace(tmp, filename)
+        except Exception as e:
+            Graph.error = e
+
+    @staticmethod
+    def remove_out():
+        # clears the drawn graph (the file backend finishes saving the newest history first)
+        # and raises the error the background thread of the file backend stopped on, if it failed
+        if Graph.fig is not None:
+            import matplotlib.pyplot as plt
+            plt.close(Graph.fig)
+            Graph.fig = None
+        if Graph.worker is not None:
+            worker, requests = Graph.worker, Graph.requests
+            Graph.worker = None
+            Graph.requests = None
+            # a dead thread never empties the queue, so the stop request is only waited for while it runs
+            while worker.is_alive():
+                try:
+                    requests.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            worker.join()
+        Graph.reset()
+        error, Graph.error = Graph.error, None
+        if error is not None:
+            raise RuntimeError(f"saving the graph to {Graph.filename} failed") from error
@@ -0,0 +1,193 @@
+import multiprocessing as mp
+import random as rd
+import traceback
+import numpy as np
+from DinoGame import DinoGameManager, DinoGen
+from Checkpoints import PlayerArchive
+
+
+def _run_island(conn, island, n, net_shape, actv_f, out_f, mut_f, crossover, selection, engine, canv_size, path, seed,
+                entropy, dt):
+    # the main loop of an island process, the island evolves its own population and only talks to the coordinator
+    # between epochs: it receives (generations, number of emigrants, immigrants), places the immigrants in the
+    # population, runs the generations and sends back the best player of every generation and its emigrants
+    # (the top players of the last generation), None stops the island
+    # every message sent to the coordinator starts with 'ok' or 'error' (the first one is sent when the island is ready)
+    # an island can run the same simulation engines as the trainer (imported here, the trainer imports this module)
+    try:
+        from Trainer import HeadlessTrainer
+
+        rd.seed(int(entropy[0]))
+        np.random.seed(entropy)
+        gm = HeadlessTrainer.ENGINES[engine](n, seed=seed, offset=island * n)
+        gm.init_games(canv_size=canv_size, path=path)
+        gm.init_net(DinoGameManager.IN_LEN, net_shape, actv_f, out_f, mut_f, crossover=crossover)
+        if selection is not None:
+            gm.set_selection(selection)
+        conn.send(('ok',))
+
+        while (msg := conn.recv()) is not None:
+            gens, emigrants_count, immigrants = msg
+            # the immigrants replace the last children of the population and are evaluated in the next generation
+            for j, (_, ws, bs) in enumerate(immigrants):
+                gm.nets.set_ith_net(n - 1 - j, ws, bs)
+
+            emigrants = []
+            for g in range(gens):
+                while gm.not_all_dead():
+                    gm.return_best()
+                    gm.single_frame(dt)
+                if g == gens - 1:
+                    top = np.argsort(-gm.scores, kind='stable')[:emigrants_count]
+                    emigrants = [(gm.get_score(i), *gm.nets.get_ith_net(i)) for i in top]
+                gm.mutate()
+                gm.restart()
+
+            conn.send(('ok', gm.bestPlayers, emigrants))
+            gm.bestPlayers = [] # the coordinator keeps the best players
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class IslandModel:
+    # class that evolves several independent populations (islands) in separate processes
+    # every island runs whole generations on its own (nothing is synchronized between frames) and every
+    # migrate_every generations the coordinator collects the top players of every island and sends them
+    # to the next island in a ring, where they replace the last children of the population
+    # the coordinator keeps the best player of every generation (the best of all the islands) in the
+    # normal best players list / archive and tracks the champion of the whole run
+
+    def __init__(self, islands, n, net_shape, actv_f, out_f, mut_f, crossover='uniform', engine='object',
+                 migrate_every=10, migrants=2, canv_size=(800, 600), path='assets', seed=None, dt=DinoGen.FIXED_DT,
+                 selection=None):
+        # an init function for the island model class
+        # the function receives the number of islands, the number of agents in every island, the shape of the
+        # network, the activation and mutation functions (names or picklable functions), the crossover mode,
+        # the simulation engine of the islands, the number of generations between migrations, the number of
+        # players every island sends to the next one, the size of the canvas, the run seed (with a seed the
+        # whole run is deterministic, every island draws from its own streams), the delta time of every frame
+        # and the selection strategy of every island (see Selection, None for the default lineage selection)
+        if not 0 <= migrants < n:
+            raise ValueError(f"an island of {n} players can't send {migrants} migrants")
+        if migrate_every < 1:
+            raise ValueError("the islands have to run at least one generation between migrations")
+        self.n = n
+        self.net_shape = net_shape
+        self.migrate_every = migrate_every
+        self.migrants = migrants if islands > 1 else 0
+
+        self.gen = 0 # generation number (of every island)
+        self.bestPlayers = [] # the best player of all the islands in each generation
+        self.champion = None # the best player of the whole run (score, [weights], [biases])
+        self.champion_island = None # the island the champion was bred on
+        self.writer = None # saves the best player of every generation in the background (see Checkpoints.ArchiveWriter)
+        self.immigrants = [[] for _ in range(islands)] # the players waiting to be sent to every island
+
+        entropy = np.random.SeedSequence(seed).spawn(islands)
+        self.conns = []
+        self.procs = []
+        for island in range(islands):
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_run_island, daemon=True,
+                              args=(child, island, n, net_shape, actv_f, out_f, mut_f, crossover, selection, engine,
+                                    canv_size, path, seed, entropy[island].generate_state(4), dt))
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        try:
+            self.receive()
+        except RuntimeError:
+            self.close()
+            raise
+
+    @property
+    def islands(self):
+        # the number of islands
+        return len(self.procs)
+
+    def set_writer(self, writer):
+        # sets the archive writer the best player of every generation is handed to (None to stop saving)
+        self.writer = writer
+
+    def run_epoch(self, gens):
+        # runs the passed amount of generations on all the islands at once, then moves the migrants to the
+        # next islands, returns the score of the best player of every generation
+        for conn, immigrants in zip(self.conns, self.immigrants):
+            conn.send((gens, self.migrants, immigrants))
+
+        results = self.receive()
+        scores = []
+        for g in range(gens):
+            players = [players[g] for players, _ in results]
+            island = max(range(self.islands), key=lambda i: players[i][0])
+            self.add_best(players[island], island)
+            scores.append(players[island][0])
+        self.gen += gens
+
+        self.immigrants = [results[i - 1][1] for i in range(self.islands)] if self.migrants else self.immigrants
+        return scores
+
+    def receive(self):
+        # returns the next message of every island, raises an error if an island failed
+        results = []
+        for island, conn in enumerate(self.conns):
+            status, *result = conn.recv()
+            if status == 'error':
+                raise RuntimeError(f"island {island} failed:\n{result[0]}")
+            results.append(result)
+        return results
+
+    def add_best(self, player, island):
+        # remembers the best player of a generation and updates the champion
+        self.bestPlayers += [player]
+        if self.writer is not None:
+            self.writer.put(player)
+        if self.champion is None or player[0] > self.champion[0]:
+            self.champion = player
+            self.champion_island = island
+
+    def train(self, gens, verbose=True):
+        # trains the passed amount of generations (migrating every migrate_every generations)
+        # and returns the best players of all the generations
+        last = self.gen + gens
+        while self.gen < last:
+            scores = self.run_epoch(min(self.migrate_every, last - self.gen))
+            if verbose:
+                print(f"gen {self.gen}/{last} score: {int(max(scores))} "
+                      f"champion: {int(self.champion[0])} (island {self.champion_island})")
+        return self.bestPlayers
+
+    def get_best_players(self):
+        # returns the best players in the whole training period (all the generations)
+        return self.bestPlayers
+
+    def save(self, path=PlayerArchive.DEFAULT_PATH):
+        # saves the best players to an archive directory in the same format the scene manager saves them
+        PlayerArchive.save(path, self.bestPlayers, self.net_shape)
+
+    def close(self):
+        # stops the island processes and finishes writing the archive
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proc, conn in zip(self.procs, self.conns):
+            proc.join()
+            conn.close()
+        self.procs = []
+        self.conns = []
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,16 +1,125 @@
-import numpy as np
 import time as t
-from kivy.graphics import Rectangle, Color, Ellipse, Line
+import numpy as np
+
+
+class Activations:
+    # a registry of named activation functions of the network layers
+    # every registered function is a numpy ufunc expression so it works on a whole array at once
+    # without a python loop over the elements
+    FUNCS = {} # name -> function, filled below the class
+
+    @staticmethod
+    def leaky_relu(x):
+        # leaky ReLu, the same as max(x, 0.1*x)
+        return np.maximum(x, 0.1 * x)
+
+    @staticmethod
+    def relu(x):
+        # ReLu, max(x, 0)
+        return np.maximum(x, 0)
+
+    @staticmethod
+    def tanh(x):
+        # hyperbolic tangent
+        return np.tanh(x)
+
+    @staticmethod
+    def sigmoid(x):
+        # sigmoid, the same as 1/(1+e^-x) without overflowing
+        return 0.5 * (np.tanh(0.5 * x) + 1)
+
+    @staticmethod
+    def softplus(x):
+        # SoftPlus, log(1+e^x) without overflowing
+        return np.logaddexp(0, x)
+
+    @staticmethod
+    def identity(x):
+        # no activation
+        return x
+
+    @staticmethod
+    def names():
+        # returns the names of all the registered functions
+        return list(Activations.FUNCS)
+
+    @staticmethod
+    def get(func):
+        # returns a function that works on whole arrays
+        # the function receives either the name of a registered function or any python callable
+        # callables that aren't registered are wrapped with np.vectorize (slow, a python call per element)
+        if isinstance(func, str):
+            if func not in Activations.FUNCS:
+                raise ValueError(f"unknown activation function: {func}, possible: {Activations.names()}")
+            return Activations.FUNCS[func]
+        return np.vectorize(func)
+
+
+Activations.FUNCS = {
+    'leaky_relu': Activations.leaky_relu,
+    'relu': Activations.relu,
+    'tanh': Activations.tanh,
+    'sigmoid': Activations.sigmoid,
+    'softplus': Activations.softplus,
+    'identity': Activations.identity,
+}
+
+
+class Mutations:
+    # a registry of named mutation distributions, a distribution maps uniform noise in [-1, 1]
+    # to the offsets that are added to the weights and biases of the children (see Nets.mutate)
+    # like the activations every registered function is a numpy ufunc expression
+    FUNCS = {} # name -> function, filled below the class
+
+    @staticmethod
+    def bell(x):
+        # maps uniform noise in [-1, 1] to mostly small offsets
+        return 0.1 * x ** 3
+
+    @staticmethod
+    def names():
+        # returns the names of all the registered distributions
+        return list(Mutations.FUNCS)
+
+    @staticmethod
+    def get(func):
+        # returns a distribution that works on whole arrays
+        # the function receives either the name of a registered distribution or any python callable
+        # callables that aren't registered are wrapped with np.vectorize (slow, a python call per element)
+        if isinstance(func, str):
+            if func not in Mutations.FUNCS:
+                raise ValueError(f"unknown mutation distribution: {func}, possible: {Mutations.names()}")
+            return Mutations.FUNCS[func]
+        return np.vectorize(func)
+
+
+Mutations.FUNCS = {
+    'bell': Mutations.bell,
+}
 
 
 class Nets:
     # a neural network class (of type fully connected), that lets users access weights and biases
     # this class acts as the brain for the agents (mathematical function that makes the decisions)
-    def __init__(self, n, inputLength, netShape, aFuncH, aFuncO, mut_func):
+
+    # crossover modes:
+    # uniform - every weight and bias is taken from a random parent
+    # single_point - the parameters of a neuron layer are cut at a random point, before it they are taken from
+    #                one random parent and after it from another
+    # neuron - all the weights and the bias of a neuron are taken from the same random parent
+    CROSSOVER_MODES = ('uniform', 'single_point', 'neuron')
+
+    def __init__(self, n, inputLength, netShape, aFuncH, aFuncO, mut_func, crossover='uniform'):
         # the function initializes the neural network class for n neural networks
         # the function receives the number of agents (neural networks), the number of inputs, the shape of the network,
-        # the activation function for the hidden layers ,the activation function for the output layer
-        # and a function that describes the probability distributions for mutation
+        # the activation function for the hidden layers ,the activation function for the output layer,
+        # a function that describes the probability distributions for mutation and the crossover mode
+        # the functions are either names of registered functions (in the Activations and Mutations classes)
+        # or python callables
+        if crossover not in Nets.CROSSOVER_MODES:
+            raise ValueError(f"unknown crossover mode: {crossover}, possible: {Nets.CROSSOVER_MODES}")
+        self.crossover_mode = crossover
+
         self.net_length = 0
 
         self.net_shape = netShape
@@ -21,22 +130,32 @@ class Nets:
         self.weights = []
         self.bias = []
 
-        self.aFuncH = np.vectorize(aFuncH) # most common ReLu\SoftPlus\Sigmoid
-        self.aFuncO = np.vectorize(aFuncO) # most common ReLu\SoftPlus\Sigmoid
-        self.mut = np.vectorize(mut_func)
+        self.aFuncH = Activations.get(aFuncH) # most common ReLu\SoftPlus\Sigmoid
+        self.aFuncO = Activations.get(aFuncO) # most common ReLu\SoftPlus\Sigmoid
+        self.mut = Mutations.get(mut_func)
 
     def net_weights_init(self):
         # the function initializes the weights and biases of the networks
         # format of net shape [(hidden L)..., (output L)] ::=> (neuron length, sequence length)
         # last tuple is output layer
-        start = t.time()
         prev = self.input_length
         for lSeq in self.net_shape:  # each layer
             for l in range(lSeq[1]):
                 self.weights += [2*np.random.random((self.n, lSeq[0], prev))-1]
                 prev = lSeq[0]
                 self.bias += [2*np.random.random((self.n, prev, 1))-1]
-        print(f"timeRandom:{t.time() - start}")
+
+    @staticmethod
+    def layer_shapes(input_length, net_shape):
+        # the function returns the shapes of the weights and bias of every layer of a single network
+        # as a list of ((neurons, previous neurons), (neurons, 1))
+        shapes = []
+        prev = input_length
+        for lSeq in net_shape:  # each layer
+            for l in range(lSeq[1]):
+                shapes += [((lSeq[0], prev), (lSeq[0], 1))]
+                prev = lSeq[0]
+        return shapes
 
     def net_len(self):
         # the function returns the number of layers in the network shape and saves it to the net_length variable
@@ -47,32 +166,37 @@ class Nets:
         # linear sum (x input, w,b, activation function) in forward pass calculation
         return aFunc(w @ x + b)
 
-    def forward_pass(self, inputs, maxnotmin):
+    def forward_pass(self, inputs, maxnotmin, idxs=None):
         # the forwards pass of the network
         # the function receives and input vector and a boolean that tells the function it needs to return the maximum
         # of the outputs or the minimum of the outputs
+        # if an array of indexes is passed only the networks at the indexes are calculated
+        # (the inputs then have a row for every index, e.g. only the games that are still alive)
 
         # initializing inputs
         x = inputs.copy()  # not necessary
         # calculation forward passes
         for i in range(self.net_length):
+            w, b = self.weights[i], self.bias[i]
+            if idxs is not None:
+                w, b = w[idxs], b[idxs]
             if i < self.net_length - 1:
-                x = self.linear(x, self.weights[i], self.bias[i], self.aFuncH)  # probably redundant
+                x = self.linear(x, w, b, self.aFuncH)  # probably redundant
             else:
-                x = self.linear(x, self.weights[i], self.bias[i], self.aFuncO)  # probably redundant
+                x = self.linear(x, w, b, self.aFuncO)  # probably redundant
         # mapping outputs
         if maxnotmin: # case max function
             return x.argmax(axis=1),x
         else: # case min function
             return x.argmin(axis=1),x
 
-    def mutate(self,parent_idxs):
+    def mutate(self,parent_idxs,elites=None):
         # the function mutates the current weights and biases based on the specified parents and mutation function
-        # the function receives the indexes of the weights of the parents
+        # the function receives the indexes of the weights of the parents, either a list of parents shared by all
+        # the children or an array (n, parents) with the parents of every child (see Selection)
+        # and optionally the indexes of elite networks that are copied unchanged to the first children
         # the function takes the networks of the parents randomly overlaps them n times (crossover) to create n new networks
         # then to mutate the network a small random offset is added to all the weights and biases of every network
-        zz = np.vectorize(Nets.zigzag)
-        n_parents = len(parent_idxs)
         new_w = []
         new_b = []
 
@@ -80,21 +204,74 @@ class Nets:
             shape_w = self.weights[i].shape
             shape_b = self.bias[i].shape
             # crossover calculation for bias and weights with equal distribution of all parents
-            crossover_w = np.array([[self.weights[i][np.random.choice(parent_idxs,self.n),y,x] for x in range(shape_w[2])] for y in range(shape_w[1])]).swapaxes(0,1).T
-            crossover_b = np.array([[self.bias[i][np.random.choice(parent_idxs,self.n),y,x] for x in range(shape_b[2])] for y in range(shape_b[1])]).swapaxes(0,1).T
+            # the bias is the last column of the layer so the neuron and single point modes keep it with its weights
+            layer = np.concatenate((self.weights[i], self.bias[i]), axis=2)
+            crossover = self.crossover(layer, parent_idxs)
+            crossover_w, crossover_b = crossover[:, :, :-1], crossover[:, :, -1:]
             # mutation calculation for bias and weights
-            new_w += [zz(crossover_w + self.mut(np.random.uniform(-1.0,1.0,shape_w)))]
-            new_b += [zz(crossover_b + self.mut(np.random.uniform(-1.0,1.0,shape_b)))]
+            new_w += [Nets.zigzag(crossover_w + self.mut(np.random.uniform(-1.0,1.0,shape_w)))]
+            new_b += [Nets.zigzag(crossover_b + self.mut(np.random.uniform(-1.0,1.0,shape_b)))]
+            if elites is not None and len(elites) > 0:
+                new_w[-1][:len(elites)] = self.weights[i][elites]
+                new_b[-1][:len(elites)] = self.bias[i][elites]
 
         self.weights = new_w
         self.bias = new_b
 
+    def crossover(self, layer, parent_idxs):
+        # the function creates n new layers out of the layers of the parents in a single gather
+        # the function receives the layer of all the networks (n, out, in) and the indexes of the parents
+        # a mask of parent numbers with the shape (n, out, in) picks the parent of every parameter of every child
+        # and is turned into the index of the network every parameter is taken from
+        parent_idxs = np.asarray(parent_idxs)
+        n_parents = parent_idxs.shape[-1]
+        _, out_len, in_len = layer.shape
+
+        if self.crossover_mode == 'uniform':
+            mask = np.random.randint(n_parents, size=(self.n, out_len, in_len))
+        elif self.crossover_mode == 'neuron':
+            mask = np.broadcast_to(np.random.randint(n_parents, size=(self.n, out_len, 1)), (self.n, out_len, in_len))
+        else: # single point
+            first = np.random.randint(n_parents, size=(self.n, 1))
+            second = np.random.randint(n_parents, size=(self.n, 1))
+            point = np.random.randint(out_len * in_len + 1, size=(self.n, 1))
+            mask = np.where(np.arange(out_len * in_len) < point, first, second).reshape(self.n, out_len, in_len)
+
+        if parent_idxs.ndim == 1: # the same parents for all the children
+            source = parent_idxs[mask]
+        else: # the parents of every child
+            source = np.take_along_axis(parent_idxs, mask.reshape(self.n, -1), axis=1).reshape(mask.shape)
+        return layer[source, np.arange(out_len)[:, np.newaxis], np.arange(in_len)]
+
     def get_ith_net(self,i):
         # function returns the ith network
         ws = [w[i] for w in self.weights]
         bs = [b[i] for b in self.bias]
         return ws,bs
 
+    def set_ith_net(self, i, ws, bs):
+        # function replaces the ith network with the passed weights and biases (in place)
+        for w, new_w in zip(self.weights, ws):
+            w[i] = new_w
+        for b, new_b in zip(self.bias, bs):
+            b[i] = new_b
+
+    def get_flat(self):
+        # function returns the weights and biases of all the networks as a (n x parameters) matrix
+        # (every row is a network, the layers in order with the weights of a layer before its bias)
+        return np.concatenate([a.reshape(self.n, -1) for w, b in zip(self.weights, self.bias) for a in (w, b)], axis=1)
+
+    def set_flat(self, matrix):
+        # function replaces the weights and biases of all the networks with the rows of a matrix in the order of get_flat
+        weights, bias = [], []
+        offset = 0
+        for w, b in Nets.layer_shapes(self.input_length, self.net_shape):
+            weights += [matrix[:, offset:offset + w[0] * w[1]].reshape(self.n, *w)]
+            offset += w[0] * w[1]
+            bias += [matrix[:, offset:offset + b[0]].reshape(self.n, *b)]
+            offset += b[0]
+        self.set_variables(weights, bias)
+
     def set_variables(self,ws,bs):
         # the function receives new weights and biases and updates the current ones
         self.weights = ws
@@ -114,6 +291,7 @@ class Nets:
 class NetVis:
     # a purely visualizing class
     # the class displays a specified network and shows how it is updated while the game is running
+    MIN_INTERVAL = 1 / 60 # the minimum number of seconds between refreshes of the display
 
     def __init__(self,canvas,pos,size,gm):
         # an init function for the visualizer network class
@@ -131,9 +309,19 @@ class NetVis:
 
         self.canvas = canvas
 
+        # the state of the last refresh
+        self.key = None # the (generation, best index) the line widths were computed for
+        self.weights = None # the weights list the line widths were computed from (mutating replaces the list)
+        self.angles = np.zeros(0) # the angles of the input and output nodes
+        self.last_update = -np.inf
+        self.angle_nodes = [] # the input and output nodes in the order of the angles
+        self.all_lines = [] # the lines of all the layers in the order of the weights
+
     def init_nodes(self, size=1):
         # the function initializes the nodes objects
         # the function receives the relative size of the nodes
+        from kivy.graphics import Ellipse
+
         mx = self.gm.nets.input_length
         for tmp in self.gm.nets.net_shape: # finding the largest layer
             mx = max(tmp[0], mx)
@@ -162,16 +350,20 @@ class NetVis:
                     layer += [Ellipse(pos=(tmpX+self.pos[0], tmpY+self.pos[1]), size=(self.nodeSize, self.nodeSize))]
                     tmpY += offY
                 self.nodes += [layer]
+        self.angle_nodes = self.nodes[0] + self.nodes[-1]
 
     def init_lines(self,width):
         # the function initializes the line objects
         # the function receives the width of the lines
+        from kivy.graphics import Line
+
         for i in range(1,len(self.nodes)):
             layer = []
             for node1 in self.nodes[i-1]:
                 for node2 in self.nodes[i]:
                     layer += [Line(points=[node1.pos[0]+self.nodeSize/2,node1.pos[1]+self.nodeSize/2,node2.pos[0]+self.nodeSize/2,node2.pos[1]+self.nodeSize/2],width=width)]
             self.lines += [layer]
+        self.all_lines = [line for layer in self.lines for line in layer]
 
     def draw_canvas(self):
         # the function draws the line and node objects to the canvas
@@ -182,46 +374,48 @@ class NetVis:
             for node in layer:
                 self.canvas.add(node)
 
-    def update(self):
+    def update(self, force=False):
         # the function updates the network based on the new inputs and outputs
-        best = self.gm.best[-1]
-        inputs = self.normalize(self.gm.games[best].inputs)
-        inputs[-1] = np.sign(inputs[-1])
-        inputs[-2] = np.sign(inputs[-2])
-
-        for node,inpu in zip(self.nodes[0],inputs[::-1]):
-            pass
-            node.angle_end = self.interpolate(np.abs(inpu), 360, 0)
-            # with self.canvas:
-            #     self.canvas.remove(node)
-            #     Color(*self.interpolate(np.abs(inpu),[1,1,1,0.9],[0,0,0,0.9]))
-            #     self.canvas.add(node)
+        # the display is refreshed at most every MIN_INTERVAL seconds (unless force is true), the line widths only
+        # change with the weights of the best network so they are recomputed only when the generation, the best
+        # index or the networks change and only the node angles are pushed on every refresh
+        now = t.perf_counter()
+        if not force and now - self.last_update < NetVis.MIN_INTERVAL:
+            return
+        self.last_update = now
 
-
-        for layer in range(self.gm.nets.net_length):
-            for w,line in zip(self.gm.nets.weights[layer][best].T.flatten()[:,np.newaxis],self.lines[layer]):
-                pass
-                line.width = self.interpolate(np.abs(w),2.5,0.5)
-                # with self.canvas:
-                #     self.canvas.remove(line)
-                #     Color(*self.interpolate(w,[1, .5, .2, 0.8], [0.2, .5, 1, 0.8]))
-                #     self.canvas.add(line)
-
-
-        outputs = self.normalize(self.gm.output[best])
-
-        for node,out in zip(self.nodes[-1],outputs[::-1]):
-            pass
-            node.angle_end = self.interpolate(np.abs(out),360,0)
-            # with self.canvas:
-            #     self.canvas.remove(node)
-            #     Color(*self.interpolate(np.abs(out),[1,1,1,0.9],[0,0,0,0.9]))
-            #     self.canvas.add(node)
+        best = self.gm.best[-1]
+        key = (self.gm.gen, best)
+        if key != self.key or self.gm.nets.weights is not self.weights:
+            self.key = key
+            self.weights = self.gm.nets.weights
+            self.update_lines(best)
+
+        inputs = self.normalize(self.gm.get_game_inputs(best).ravel())
+        inputs[-2:] = np.sign(inputs[-2:])
+        outputs = self.normalize(self.gm.output[best].ravel())
+        angles = self.interpolate(np.abs(np.concatenate((inputs[::-1], outputs[::-1]))), 360, 0)
+
+        changed = np.flatnonzero(angles != self.angles) if len(angles) == len(self.angles) else range(len(angles))
+        for i in changed:
+            self.angle_nodes[i].angle_end = float(angles[i])
+        self.angles = angles
+
+    def update_lines(self, best):
+        # the function sets the widths of the lines to the weights of the passed network
+        # the widths of all the layers are computed in one call, every layer is (out, in) so its transpose
+        # is in the order of the lines (every input node with every output node)
+        weights = np.concatenate([self.gm.nets.weights[layer][best].T.ravel() for layer in range(self.gm.nets.net_length)])
+        widths = self.interpolate(np.abs(weights), 2.5, 0.5).tolist()
+        for line, width in zip(self.all_lines, widths):
+            line.width = width
 
     @staticmethod
     def normalize(x,axis=0):
         # the function normalizes the inputted vector based on the inputetd axis
-        return x/np.linalg.norm(x,axis=axis)
+        # (a zero vector, e.g. the inputs of a game that just restarted, stays zero)
+        norm = np.linalg.norm(x,axis=axis,keepdims=True)
+        return np.divide(x, norm, out=np.zeros(np.shape(x)), where=norm != 0)
 
     @staticmethod
     def interpolate(x,val1,val2):
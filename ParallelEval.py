@@ -0,0 +1,143 @@
+import multiprocessing as mp
+import random as rd
+from multiprocessing import shared_memory
+import numpy as np
+from DinoGame import DinoGameManager
+from NetworkClasses import Nets
+from VecDinoGame import VecDinoGen
+
+
+class SharedNets:
+    # class that keeps the weights and biases of n networks in a single shared memory block
+    # the layers are numpy views into the block so other processes can read them without copying
+
+    def __init__(self, n, input_length, net_shape, name=None):
+        # an init function for the shared networks class
+        # the function receives the number of networks, the number of inputs and the shape of the network
+        # if a name is passed the function attaches to an existing block instead of creating a new one
+        self.shapes = [((n, *w), (n, *b)) for w, b in Nets.layer_shapes(input_length, net_shape)]
+
+        size = sum(np.prod(w) + np.prod(b) for w, b in self.shapes) * np.dtype(np.float64).itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(create=True, size=int(size)) if self.owner \
+            else shared_memory.SharedMemory(name=name)
+
+        self.weights = []
+        self.bias = []
+        offset = 0
+        for w, b in self.shapes:
+            self.weights += [np.ndarray(w, dtype=np.float64, buffer=self.shm.buf, offset=offset)]
+            offset += int(np.prod(w)) * 8
+            self.bias += [np.ndarray(b, dtype=np.float64, buffer=self.shm.buf, offset=offset)]
+            offset += int(np.prod(b)) * 8
+
+    @property
+    def name(self):
+        # the name other processes use to attach to the block
+        return self.shm.name
+
+    def write(self, nets: Nets):
+        # copies the weights and biases of the passed networks into the shared block
+        for dst, src in zip(self.weights, nets.weights):
+            dst[:] = src
+        for dst, src in zip(self.bias, nets.bias):
+            dst[:] = src
+
+    def close(self):
+        # detaches from the block (and frees it if this object created it)
+        self.weights = []
+        self.bias = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# the state of a worker process, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(shm_name, n, input_length, net_shape, actv_f, out_f, mut_f, canv_size, path, seed, schedule):
+    # initializer of every worker process, attaches to the shared weights
+    _worker['nets'] = SharedNets(n, input_length, net_shape, name=shm_name)
+    _worker['seed'] = seed
+    _worker['schedule'] = schedule
+    _worker['args'] = (input_length, net_shape, actv_f, out_f, mut_f)
+    _worker['canv_size'] = canv_size
+    _worker['path'] = path
+    _worker['gens'] = {} # (lo, hi) -> VecDinoGen simulating that shard
+
+
+def _evaluate_shard(lo, hi, seed, dt, gen):
+    # runs the games of genomes lo..hi until all the dinos are dead and returns their scores
+    # in deterministic mode the games draw from the same streams they would in a single process
+    shared: SharedNets = _worker['nets']
+    if (lo, hi) not in _worker['gens']:
+        gm = VecDinoGen(hi - lo, seed=_worker['seed'], offset=lo)
+        gm.init_games(canv_size=_worker['canv_size'], path=_worker['path'])
+        gm.init_net(*_worker['args'], setWeights=False)
+        gm.set_schedule(_worker['schedule'])
+        gm.set_params_single([w[lo:hi] for w in shared.weights], [b[lo:hi] for b in shared.bias])
+        _worker['gens'][(lo, hi)] = gm
+    gm = _worker['gens'][(lo, hi)]
+
+    gm.gen = gen
+    if gm.seed is None:
+        rd.seed(seed)
+    gm.restart()
+    while gm.not_all_dead():
+        gm.single_frame(dt)
+    return lo, hi, gm.time.copy()
+
+
+class ParallelEvaluator:
+    # class that evaluates a population of networks on a pool of worker processes
+    # the genomes are split into shards, every worker runs the games of a shard with the vectorized engine
+    # and the scores (game times) are gathered back into a single array
+    # the networks are placed in shared memory so the workers read them without copying
+
+    def __init__(self, workers, n, net_shape, actv_f, out_f, mut_f, canv_size=(800, 600), path='assets', shards=None,
+                 seed=None, schedule=None):
+        # an init function for the parallel evaluator class
+        # the function receives the number of worker processes, the number of genomes, the shape of the network,
+        # the activation and mutation functions (names or picklable functions), the size of the canvas,
+        # the number of shards the population is split into (twice the workers by default)
+        # the run seed of the deterministic mode (see DinoGen)
+        # and the shared obstacle courses of the games (see Courses.ObstacleSchedule, None for their own obstacles)
+        self.n = n
+        self.seed = seed
+        self.shared = SharedNets(n, DinoGameManager.IN_LEN, net_shape)
+        shards = min(n, shards or workers * 2)
+        bounds = np.linspace(0, n, shards + 1).astype(int)
+        self.shards = list(zip(bounds[:-1], bounds[1:]))
+
+        self.pool = mp.Pool(workers, initializer=_init_worker,
+                            initargs=(self.shared.name, n, DinoGameManager.IN_LEN, net_shape, actv_f, out_f, mut_f,
+                                      canv_size, path, seed, schedule))
+
+    def evaluate(self, nets: Nets, dt, gen=0):
+        # runs a whole generation of the passed networks and returns the score of every genome
+        # without a run seed every shard seeds the random module with a seed drawn from numpy's global random state
+        # (with a run seed nothing is drawn so the random state stays the same as in a single process)
+        self.shared.write(nets)
+        if self.seed is None:
+            seeds = np.random.SeedSequence(np.random.randint(2**32)).generate_state(len(self.shards))
+        else:
+            seeds = np.zeros(len(self.shards), dtype=int)
+        tasks = [(int(lo), int(hi), int(s), dt, gen) for (lo, hi), s in zip(self.shards, seeds)]
+
+        scores = np.zeros(self.n)
+        for lo, hi, times in self.pool.starmap(_evaluate_shard, tasks):
+            scores[lo:hi] = times
+        return scores
+
+    def close(self):
+        # stops the workers and frees the shared memory
+        self.pool.close()
+        self.pool.join()
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,108 @@
+import contextlib
+import json
+import os
+import time as t
+
+
+class StageTimer:
+    # class that times the stages of the training loop (simulation, inference, rendering ...)
+    # every stage is timed with a context manager: with timer.stage('simulation'): ...
+    # the times are summed per generation and every generation is appended as a json line to a file
+    # a disabled timer returns the same empty context manager for every stage so the hooks cost almost nothing
+    # and can stay in the loop (DISABLED is the shared disabled timer the games use by default)
+    OFF = contextlib.nullcontext() # the context manager of a disabled timer
+    ENV = 'DINO_PROFILE' # environment variable with the file the learn scene saves its stage times to
+
+    def __init__(self, path=None, enabled=True):
+        # an init function for the stage timer class
+        # the function receives the jsonl file the generations are appended to (None to only keep them in memory)
+        # and whether the timer is enabled
+        self.path = path
+        self.enabled = enabled
+        self.stages = {} # stage name -> [calls, total seconds, max seconds] of the current generation
+        self.start = t.perf_counter() # the start time of the current generation
+        self.history = [] # the records of all the ended generations
+        self.file = open(path, 'a') if (path is not None and enabled) else None
+
+    @staticmethod
+    def from_env():
+        # returns a timer that saves to the file in the DINO_PROFILE environment variable (disabled if it isn't set)
+        path = os.environ.get(StageTimer.ENV)
+        return StageTimer(path) if path else StageTimer.DISABLED
+
+    def stage(self, name):
+        # returns a context manager that adds the time of its body to the passed stage
+        if not self.enabled:
+            return StageTimer.OFF
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        # adds a timed call to a stage
+        stats = self.stages.get(name)
+        if stats is None:
+            self.stages[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def reset(self):
+        # forgets the times of the current generation and starts it again now
+        self.stages = {}
+        self.start = t.perf_counter()
+
+    def end_generation(self, gen, **info):
+        # saves the times of the current generation (with any extra values, e.g. the score) and starts a new one
+        # returns the saved record
+        if not self.enabled:
+            return None
+        now = t.perf_counter()
+        record = {'gen': gen, 'wall_ms': (now - self.start) * 1000, **info,
+                  'stages': {name: {'calls': calls, 'total_ms': total * 1000, 'mean_ms': total * 1000 / calls,
+                                    'max_ms': peak * 1000}
+                             for name, (calls, total, peak) in self.stages.items()}}
+        self.history.append(record)
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+        self.stages = {}
+        self.start = now
+        return record
+
+    @staticmethod
+    def describe(record):
+        # returns a single line summary of a generation record (the share of the generation every stage took)
+        wall = record['wall_ms'] or 1
+        stages = ' '.join(f"{name} {s['total_ms'] / wall:.0%}"
+                          for name, s in sorted(record['stages'].items(), key=lambda i: -i[1]['total_ms']))
+        return f"gen {record['gen']} {wall:.0f}ms: {stages}"
+
+    def close(self):
+        # closes the file
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class _Stage:
+    # the context manager of a single timed stage of an enabled timer
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        # an init function for the stage class, receives the timer the time is added to and the name of the stage
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        # starts timing the stage
+        self.start = t.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # adds the time of the stage to the timer (also when the stage raised, the error isn't suppressed)
+        self.timer.add(self.name, t.perf_counter() - self.start)
+        return False
+
+
+StageTimer.DISABLED = StageTimer(enabled=False)
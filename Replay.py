@@ -0,0 +1,243 @@
+import copy
+import struct
+import numpy as np
+from DinoGame import DinoGameManager
+
+
+class Replay:
+    # the recording of a single game: the delta time of every frame, the action the network picked after every
+    # frame and the obstacles that were spawned, enough to replay the game without the network
+    # the replay is saved as a small binary file, the delta times and actions are run length encoded
+    # and the spawn frames are delta encoded (a few KB for a long game)
+    MAGIC = b'DINOREP1'
+    HEADER = struct.Struct('<qqqddd') # seed, generation, index, canvas width, canvas height, score
+
+    def __init__(self, dts, actions, spawns, canv_size=(800, 600), score=0.0, seed=None, gen=0, index=0):
+        # an init function for the replay class
+        # the function receives the delta time of every frame, the action index picked after every frame,
+        # the spawned obstacles as (frame, kind, type) tuples, the size of the canvas, the final score,
+        # the run seed (None if the game wasn't deterministic), the generation and the index of the game
+        self.dts = np.asarray(dts, dtype=np.float64)
+        self.actions = np.asarray(actions, dtype=np.uint8)
+        self.spawns = [tuple(int(v) for v in s) for s in spawns]
+        self.canv_size = tuple(canv_size)
+        self.score = float(score)
+        self.seed = seed
+        self.gen = gen
+        self.index = index
+
+    def __len__(self):
+        # returns the number of frames in the replay
+        return len(self.dts)
+
+    def encode(self):
+        # returns the replay as bytes
+        out = bytearray(Replay.MAGIC)
+        out += Replay.HEADER.pack(-1 if self.seed is None else self.seed, self.gen, self.index,
+                                  self.canv_size[0], self.canv_size[1], self.score)
+        Replay.write_varint(out, len(self))
+
+        runs = Replay.runs(self.dts)
+        Replay.write_varint(out, len(runs))
+        for value, count in runs:
+            out += struct.pack('<d', value)
+            Replay.write_varint(out, count)
+
+        runs = Replay.runs(self.actions)
+        Replay.write_varint(out, len(runs))
+        for value, count in runs:
+            out.append(int(value))
+            Replay.write_varint(out, count)
+
+        Replay.write_varint(out, len(self.spawns))
+        prev = 0
+        for frame, kind, type in self.spawns:
+            Replay.write_varint(out, frame - prev)
+            out.append(kind * 3 + type)
+            prev = frame
+        return bytes(out)
+
+    @staticmethod
+    def decode(data):
+        # creates a replay out of the bytes returned by encode
+        if data[:len(Replay.MAGIC)] != Replay.MAGIC:
+            raise ValueError("not a dino replay")
+        pos = len(Replay.MAGIC)
+        seed, gen, index, width, height, score = Replay.HEADER.unpack_from(data, pos)
+        pos += Replay.HEADER.size
+        frames, pos = Replay.read_varint(data, pos)
+
+        n_runs, pos = Replay.read_varint(data, pos)
+        values, counts = [], []
+        for _ in range(n_runs):
+            values += [struct.unpack_from('<d', data, pos)[0]]
+            count, pos = Replay.read_varint(data, pos + 8)
+            counts += [count]
+        dts = np.repeat(np.array(values, dtype=np.float64), counts)
+
+        n_runs, pos = Replay.read_varint(data, pos)
+        values, counts = [], []
+        for _ in range(n_runs):
+            values += [data[pos]]
+            count, pos = Replay.read_varint(data, pos + 1)
+            counts += [count]
+        actions = np.repeat(np.array(values, dtype=np.uint8), counts)
+
+        n_spawns, pos = Replay.read_varint(data, pos)
+        spawns = []
+        frame = 0
+        for _ in range(n_spawns):
+            delta, pos = Replay.read_varint(data, pos)
+            frame += delta
+            spawns += [(frame, data[pos] // 3, data[pos] % 3)]
+            pos += 1
+
+        if len(dts) != frames or len(actions) != frames:
+            raise ValueError("corrupted dino replay")
+        return Replay(dts, actions, spawns, (width, height), score, None if seed == -1 else seed, gen, index)
+
+    def save(self, filename):
+        # saves the replay to a file
+        with open(filename, 'wb') as f:
+            f.write(self.encode())
+
+    @staticmethod
+    def load(filename):
+        # loads a replay from a file
+        with open(filename, 'rb') as f:
+            return Replay.decode(f.read())
+
+    @staticmethod
+    def runs(values):
+        # returns the run length encoding of the passed array as a list of (value, count)
+        values = np.asarray(values)
+        if len(values) == 0:
+            return []
+        starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+        counts = np.diff(np.append(starts, len(values)))
+        return list(zip(values[starts].tolist(), counts.tolist()))
+
+    @staticmethod
+    def write_varint(out, value):
+        # appends a non negative integer to the byte array using 7 bits per byte
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def read_varint(data, pos):
+        # reads an integer written by write_varint and returns it and the position after it
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+
+
+class ReplayRecorder:
+    # class that records a single DinoGameManager while it is played by a network (set as game.recorder)
+
+    def __init__(self):
+        # an init function for the recorder class
+        self.dts = []
+        self.actions = []
+        self.spawns = []
+
+    def record_frame(self, dt):
+        # records a frame of a living dino
+        self.dts.append(dt)
+
+    def record_action(self, idx):
+        # records the action picked after the last frame (actions of dead dinos aren't recorded)
+        if len(self.actions) < len(self.dts):
+            self.actions.append(idx)
+
+    def record_spawn(self, kind, type):
+        # records an obstacle spawned during the last frame
+        self.spawns.append((len(self.dts) - 1, kind, type))
+
+    def reset(self):
+        # forgets the recording for a new game
+        self.dts = []
+        self.actions = []
+        self.spawns = []
+
+    def to_replay(self, **info):
+        # returns the recording as a replay object, receives the other values of the replay (see the Replay class)
+        actions = self.actions + [DinoGameManager.NO_ACTION] * (len(self.dts) - len(self.actions))
+        return Replay(self.dts, actions, self.spawns, **info)
+
+
+class ReplayGame(DinoGameManager):
+    # a game manager that spawns the recorded obstacles of a replay instead of random ones
+
+    def __init__(self, replay: Replay, img=None, path='assets'):
+        # an init function for the replay game class, receives the replay and the asset dictionary
+        super().__init__(canv_size=replay.canv_size, path=path, img=img)
+        self.replay = replay
+        self.spawn_pos = 0 # index of the next recorded obstacle
+
+    def next_obstacle(self):
+        # returns the next recorded obstacle instead of a random one
+        _, kind, type = self.replay.spawns[self.spawn_pos]
+        self.spawn_pos += 1
+        return kind, type
+
+    def snapshot(self):
+        # returns a copy of the state of the game
+        return self.time, self.mtime, copy.copy(self.dino), [copy.copy(o) for o in self.obstacles], self.spawn_pos
+
+    def restore(self, state):
+        # sets the state of the game to a state returned by snapshot
+        self.time, self.mtime, dino, obstacles, self.spawn_pos = state
+        self.dino = copy.copy(dino)
+        self.obstacles = [copy.copy(o) for o in obstacles]
+
+
+class ReplayPlayer:
+    # class that plays a replay frame by frame without the network and can seek to any frame
+    # every KEYFRAME frames a snapshot of the game is kept so seeking only simulates the frames after a snapshot
+    KEYFRAME = 256
+
+    def __init__(self, replay: Replay, img=None, path='assets'):
+        # an init function for the replay player class, receives the replay and the asset dictionary
+        self.replay = replay
+        self.game = ReplayGame(replay, img=img, path=path)
+        self.frame = 0 # the number of frames played
+        self.keyframes = {0: self.game.snapshot()}
+
+    def done(self):
+        # returns true if all the frames were played
+        return self.frame >= len(self.replay)
+
+    def step(self):
+        # plays the next frame (the game frame and the action picked after it)
+        if self.done():
+            return
+        self.game.updateAll(self.replay.dts[self.frame])
+        self.game.actions[self.replay.actions[self.frame]]()
+        self.frame += 1
+        if self.frame % ReplayPlayer.KEYFRAME == 0 and self.frame not in self.keyframes:
+            self.keyframes[self.frame] = self.game.snapshot()
+
+    def seek(self, frame):
+        # moves the game to the state after the passed number of frames
+        frame = max(0, min(frame, len(self.replay)))
+        key = frame - frame % ReplayPlayer.KEYFRAME
+        while key not in self.keyframes:
+            key -= ReplayPlayer.KEYFRAME
+        if not (key <= self.frame <= frame):
+            self.game.restore(self.keyframes[key])
+            self.frame = key
+        while self.frame < frame:
+            self.step()
+
+    def play(self):
+        # plays all the frames and returns the final score (the same as the recorded score)
+        self.seek(len(self.replay))
+        return self.game.time
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
@@ -10,9 +11,12 @@ from PIL import Image
 from kivy.core.window import Window
 from kivy.clock import Clock
 from DinoGame import *
+from VecDinoGame import VecDinoGen
 from NetworkClasses import *
 import random as rd
 from GraphingUtil import Graph as hp
+from Checkpoints import PlayerArchive, ArchiveWriter
+from Profiling import StageTimer
 
 
 # all the scene number codes:
@@ -37,7 +41,8 @@ class SceneCodes:
 
 class SceneManager:
     # a class that manages the game, the learning and the scenes (visual parts of the game)
-    BEST_FILENAME = "best_players.npy"  # the file which contains the best players data
+    BEST_PATH = PlayerArchive.DEFAULT_PATH  # the archive directory which contains the best players data
+    AUTOSAVE_PATH = "best_players_autosave"  # the archive the learn scene appends every generation's best player to
 
     def __init__(self, gw, n, net_shape, actv_f, out_f, mut_f):
         # an init function for the scene manager which initializes all the scene objects
@@ -48,6 +53,7 @@ class SceneManager:
         self.gw = gw
         self.current_scene = SceneCodes.MENU_SCENE
         self.best_players = []
+        self.net_shape = net_shape
 
         self.instructions = InstructScene(self, gw, (800, 600))
         self.menu_scene = MenuScene(self, gw, (800, 600), net_shape, actv_f, out_f, mut_f)
@@ -90,6 +96,7 @@ class SceneManager:
             self.learn_select_scene.initialize_scene()
         elif self.current_scene == SceneCodes.LEARN_SCENE:
             self.learn_scene.set_gen_amount(self.learn_select_scene.get_gen_amount())
+            self.learn_scene.set_resume(self.learn_select_scene.get_resume())
             self.learn_scene.initialize_scene()
         elif self.current_scene == SceneCodes.LEARN_DEATH_SCENE:
             self.best_players = self.learn_scene.get_best_players()
@@ -107,6 +114,8 @@ class SceneManager:
 
     def find_best_player(self):
         # the function returns the best player index out of the best players of all generations
+        if isinstance(self.best_players, PlayerArchive):
+            return self.best_players.best_index()
         best = 0
         for i in range(len(self.best_players)):
             if self.best_players[i][0] > self.best_players[best][0]:
@@ -115,8 +124,7 @@ class SceneManager:
 
     def save_best_players(self):
         # this function takes the current best players networks and saves them to a file
-        npplayers = np.array(self.best_players)
-        np.save(SceneManager.BEST_FILENAME, npplayers)
+        PlayerArchive.save(SceneManager.BEST_PATH, self.best_players, self.net_shape)
         print("saved successfully!")
 
     def update_scene(self, dt):
@@ -224,7 +232,7 @@ class InstructScene(Scene):
         self.gw.add_widget(text)
 
         text2 = Label(font_size='16sp', halign='center', pos=(352, 115))
-        text2.text = "\n\nThe menu automatically tries to load the best players file (\"best_players.npy\") \nif the file isn't found you need to train the dinos (press the learn button)"
+        text2.text = "\n\nThe menu automatically tries to load the best players (\"best_players\") \nif the file isn't found you need to train the dinos (press the learn button)"
         self.gw.add_widget(text2)
 
         instruct = Button(text='Menu', font_size='20sp', halign='center', pos=(10, 10))
@@ -369,15 +377,18 @@ class MenuScene(Scene):
         self.scene_manager.set_scene(SceneCodes.INSTRUCTIONS)
 
     def load_best(self):
-        # tries to load a best players file
+        # tries to load the best players archive, an old best players file is converted to an archive once
         try:
-            best = np.load(SceneManager.BEST_FILENAME, allow_pickle=True)
+            best = PlayerArchive.open(SceneManager.BEST_PATH)
         except FileNotFoundError:
-            print("file not found")
-        else:
-            if best is not None:
-                self.scene_manager.set_best_players(best)
-                self.best_players_exist = True
+            try:
+                best = PlayerArchive.convert(PlayerArchive.LEGACY_FILENAME, SceneManager.BEST_PATH)
+            except FileNotFoundError:
+                print("file not found")
+                return
+        if len(best) > 0:
+            self.scene_manager.set_best_players(best)
+            self.best_players_exist = True
 
 
 # regular play scenes
@@ -484,16 +495,19 @@ class DeathScene(Scene):
 class LearnSelectScene(Scene):
     # learning select scene class that extends the scene class
     # this scene is the select screen for learning scene
-    # (lets the user pick the number of generations for the genetic algorythm)
+    # (lets the user pick the number of generations for the genetic algorythm
+    # and whether to start over or to resume the last training)
     def __init__(self, scene_manager, gw, window_size):
         # init function for the class
         super().__init__(scene_manager, gw, window_size)
         self.labelText: Label = None
         self.genText: TextInput = None
+        self.resume = False
 
     def initialize_scene(self):
         # extended function that initializes the scene
         self.update_window_size()
+        self.resume = False
 
         with self.gw.canvas:
             Color(0.9, 0.85, 0.9, 1)
@@ -515,12 +529,18 @@ class LearnSelectScene(Scene):
         self.genText.padding = [4, 5, 5, 5]
         self.gw.add_widget(self.genText)
 
-        menuButton = Button(text='Start', font_size='40sp', halign='center', pos=(310, 150))
+        menuButton = Button(text='Start', font_size='40sp', halign='center', pos=(210, 150))
         menuButton.width += 80
         menuButton.height -= 20
         menuButton.bind(on_press=self.next_scene)
         self.gw.add_widget(menuButton)
 
+        resumeButton = Button(text='Resume', font_size='33sp', halign='center', pos=(410, 150))
+        resumeButton.width += 80
+        resumeButton.height -= 20
+        resumeButton.bind(on_press=self.resume_scene)
+        self.gw.add_widget(resumeButton)
+
     def get_gen_amount(self):
         # returns the value (number if generations) entered into the text area in the game
         # the function also returns 1 if no value is entered
@@ -532,6 +552,15 @@ class LearnSelectScene(Scene):
             return int(self.genText.text)
         return 1
 
+    def get_resume(self):
+        # returns true if the user picked to resume the last training
+        return self.resume
+
+    def resume_scene(self, value):
+        # ends the scene and resumes the last training (this function is bound to a button)
+        self.resume = True
+        self.end_scene()
+
     def end_scene(self):
         # extended function that ends the scene
         # calls the scene manager and changes the current scene to the learning scene
@@ -544,11 +573,20 @@ class LearnScene(Scene):
     # learn scene class that extends the scene class
     # this scene is scene where the computer learns how to play the game while running for the amount of generations
     # entered before
+    # the generation is drawn by one of two renderers (picked with the DINO_RENDER environment variable):
+    # 'batched' - all the games are drawn with a single mesh (BatchedGenVis), the games run on the vectorized
+    #             engine whose state arrays the mesh is written from, needs the texture atlas of the assets
+    # 'top' - only the best few games are drawn (DinoGenVis), the games run on the object engine
+    RENDER_MODES = ('batched', 'top')
+    render = os.environ.get('DINO_RENDER', 'batched')
+
     def __init__(self, scene_manager, gw, window_size, n, net_shape, actv_f, out_f, mut_f):
         # init function for the class
         super().__init__(scene_manager, gw, window_size)
         self.scores = []
         self.numGen = 1
+        self.resume = False # continue the training saved in the autosave archive
+        self.lastGen = 1 # the generation the training ends at
 
         self.timeText: TextInput = None
         self.timeLabel: Label = None
@@ -558,9 +596,10 @@ class LearnScene(Scene):
         self.score: Label = None
 
         self.prev_best_gm = None
-        self.gm_vis: DinoGenVis = None
+        self.gm_vis: DinoGenVis | BatchedGenVis = None
         self.net: NetVis = None
-        self.gm: DinoGen = None
+        self.gm: DinoGen | VecDinoGen = None
+        self.timer: StageTimer = StageTimer.DISABLED # times the stages of every frame (set DINO_PROFILE to a file)
 
         self.net_shape = net_shape
         self.n = n
@@ -573,6 +612,10 @@ class LearnScene(Scene):
         # sets the number of generations to the inputted amount
         self.numGen = gen
 
+    def set_resume(self, resume):
+        # sets whether to resume the training saved in the autosave archive or to start over
+        self.resume = resume
+
     def initialize_scene(self):
         # extended function that initializes the scene
         self.update_window_size()
@@ -587,10 +630,31 @@ class LearnScene(Scene):
             Rectangle(size=(Window.size[0], Window.size[1] / 2), pos=(0, Window.size[1] / 2))
             Color(0.3, 0.6, 0.7, 0.7)
 
-        self.gm = DinoGen(self.n)
+        if LearnScene.render not in LearnScene.RENDER_MODES:
+            raise ValueError(f"unknown render mode: {LearnScene.render}, possible: {LearnScene.RENDER_MODES}")
+        batched = LearnScene.render == 'batched'
+        if batched and not BatchedGenVis.supported(DinoGameManager.Find_Dino_Images('assets')):
+            print("the sprites aren't packed in a texture atlas, only the best games are drawn")
+            batched = False
+
+        self.gm = VecDinoGen(self.n) if batched else DinoGen(self.n)
         self.gm.init_games(canv_size=Window.size)
         self.gm.init_net(DinoGameManager.IN_LEN, self.net_shape, self.activation_function, self.output_function,
                          self.mutation_function)
+        self.timer = StageTimer.from_env()
+        self.gm.set_timer(self.timer)
+        if self.resume:
+            try:
+                self.gm.resume(SceneManager.AUTOSAVE_PATH)
+                self.scores = [int(p[0]) for p in self.gm.get_best_players()]
+            except (FileNotFoundError, ValueError) as e:
+                print("no training to resume:", e)
+                self.resume = False
+        self.lastGen = self.gm.gen + self.numGen
+        # every generation's best player and the population are saved in the background
+        # so a crash doesn't lose the training and it can be resumed
+        self.gm.set_writer(ArchiveWriter(SceneManager.AUTOSAVE_PATH, self.net_shape, population=True,
+                                         append=self.resume, rows=self.gm.gen))
 
         self.net = NetVis(self.gw.canvas, (650, 425), (120, 150), self.gm)
         self.net.init_nodes(1)
@@ -600,7 +664,10 @@ class LearnScene(Scene):
         with self.gw.canvas:
             Color(0.9, 0.9, 1, 0.6)
 
-        self.gm_vis = DinoGenVis(self.n, self.gw.canvas)
+        if batched:
+            self.gm_vis = BatchedGenVis(self.n, self.gw.canvas)
+        else:
+            self.gm_vis = DinoGenVis(self.n, self.gw.canvas)
         self.gm_vis.init_games(30, 0, self.gm)
 
         self.prev_best_gm = 0
@@ -638,12 +705,12 @@ class LearnScene(Scene):
 
     def update_scene(self, dt):
         # extended function that updates the visual and the computational part of the scene
-        self.score.text = 'Score: ' + str(int(self.gm.games[self.prev_best_gm].time))
+        self.score.text = 'Score: ' + str(int(self.gm.get_score(self.prev_best_gm)))
         self.alive.text = 'Alive: ' + str(self.gm.check_dead())
-        self.gen.text = 'Gen: ' + str(self.gm.gen) + '/' + str(self.numGen)
+        self.gen.text = 'Gen: ' + str(self.gm.gen) + '/' + str(self.lastGen)
         self.bestPlayer.text = str(self.prev_best_gm) + 's Brain'
 
-        if self.gm.gen >= self.numGen:
+        if self.gm.gen >= self.lastGen:
             self.end_scene()
             return
         else:
@@ -651,26 +718,33 @@ class LearnScene(Scene):
             if self.timeText.text.isdigit():
                 val = int(self.timeText.text)
 
+            # the games run val steps for every drawn frame
             for _ in range(val):
+                if self.gm.gen >= self.lastGen:
+                    break
                 if self.gm.not_all_dead():
-                    self._display_best()
+                    with self.timer.stage('best'):
+                        self.prev_best_gm = self.gm.return_best()
                     self.gm.single_frame(dt)
-                    self.gm_vis.single_frame()
-                    self.net.update()
                 else:
-                    self.scores += [int(self.gm.games[self.prev_best_gm].time)]
-                    hp.plot(self.scores)
-                    self.gm.mutate()
-                    self.gm.restart()
+                    gen = self.gm.gen
+                    self.scores += [int(self.gm.get_score(self.prev_best_gm))]
+                    with self.timer.stage('plotting'):
+                        hp.plot(self.scores)
+                    with self.timer.stage('mutation'):
+                        self.gm.mutate()
+                        self.gm.restart()
+                    self.timer.end_generation(gen, score=self.scores[-1])
+
+            with self.timer.stage('rendering'):
+                self._display_best()
+                self.gm_vis.single_frame()
+            with self.timer.stage('netvis'):
+                self.net.update()
 
     def _display_best(self):
-        # function that gets the current best game in the generation
-        # and displays the best game at the top of the game window
-        if self.prev_best_gm != (best_gm := self.gm.return_best()):
-            self.gm_vis.vis_games[self.prev_best_gm].yoff = 0
-            self.prev_best_gm = best_gm
-        else:
-            self.gm_vis.vis_games[best_gm].yoff = Window.size[1] / 2
+        # function that displays the current best game in the generation at the top of the game window
+        self.gm_vis.set_best(self.prev_best_gm, Window.size[1] / 2)
 
     def get_best_players(self):
         # returns the best players from all the generations as an array of networks
@@ -679,6 +753,10 @@ class LearnScene(Scene):
     def end_scene(self):
         # extended function that ends the scene
         # calls the scene manager and changes current scene to the learn death scene
+        if self.gm.writer is not None:
+            self.gm.writer.close()
+            self.gm.set_writer(None)
+        self.timer.close()
         if self.scene_manager is None:
             return
         self.scene_manager.set_scene(SceneCodes.LEARN_DEATH_SCENE)
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class Selection:
+    # class that picks the parents and the elites of the next generation from the scores of the current one
+    # every strategy is computed on the whole score array at once (numpy.random draws, no python loop per genome):
+    # 'lineage' - the last two leaders of the generation (DinoGen.best) are the parents of all the children,
+    #             the original behavior of the game
+    # 'truncation' - the top k players are the parents of all the children
+    # 'tournament' - every parent of every child is the best of tournament_size random players
+    # 'proportional' - every parent of every child is drawn with a probability proportional to its score above the
+    #                  worst score
+    # 'rank' - every parent of every child is drawn with a probability proportional to its rank
+    # with elitism the top e players are carried unchanged into the first e networks of the next generation
+    STRATEGIES = ('lineage', 'truncation', 'tournament', 'proportional', 'rank')
+
+    def __init__(self, strategy='lineage', elites=0, parents=2, top=2, tournament_size=3):
+        # an init function for the selection class
+        # the function receives the name of the strategy, the number of elites, the number of parents of every
+        # child (tournament, proportional and rank), the number of parents of truncation selection
+        # and the number of players in every tournament
+        if strategy not in Selection.STRATEGIES:
+            raise ValueError(f"unknown selection strategy: {strategy}, possible: {Selection.STRATEGIES}")
+        if elites < 0 or parents < 1 or top < 1 or tournament_size < 1:
+            raise ValueError("the number of elites can't be negative and there has to be at least one parent and player")
+        self.strategy = strategy
+        self.elites_count = elites
+        self.parents_count = parents
+        self.top_count = top
+        self.tournament_size = tournament_size
+
+    def parents(self, scores, best):
+        # returns the parents of the next generation, a list of parents shared by all the children or an array
+        # (n, parents) with the parents of every child (see Nets.mutate)
+        # the function receives the score of every player and the lineage of the leaders of the generation
+        scores = np.asarray(scores, dtype=np.float64)
+        n = len(scores)
+        if self.strategy == 'lineage':
+            return [best[-1], best[-2]] if len(best) > 1 else [best[-1]]
+        if self.strategy == 'truncation':
+            return Selection.top(scores, self.top_count)
+        if self.strategy == 'tournament':
+            players = np.random.randint(n, size=(n, self.parents_count, self.tournament_size))
+            winners = np.argmax(scores[players], axis=2)
+            return np.take_along_axis(players, winners[:, :, np.newaxis], axis=2)[:, :, 0]
+
+        if self.strategy == 'proportional':
+            weights = scores - scores.min()
+        else: # rank, the worst player has the rank 1
+            weights = np.empty(n)
+            weights[np.argsort(scores, kind='stable')] = np.arange(1, n + 1)
+        total = weights.sum()
+        p = weights / total if total > 0 else None # uniform if all the scores are equal
+        return np.random.choice(n, size=(n, self.parents_count), p=p)
+
+    def elites(self, scores):
+        # returns the indexes of the elites (the best players first), None without elitism
+        if self.elites_count == 0:
+            return None
+        return Selection.top(np.asarray(scores, dtype=np.float64), self.elites_count)
+
+    @staticmethod
+    def top(scores, k):
+        # returns the indexes of the k best scores from the best to the worst (the first of equal scores first)
+        k = min(k, len(scores))
+        idxs = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return idxs[np.lexsort((idxs, -scores[idxs]))]
+
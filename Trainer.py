@@ -0,0 +1,267 @@
+import argparse
+import os
+import random as rd
+import time as t
+from DinoGame import *
+from VecDinoGame import VecDinoGen
+from ParallelEval import ParallelEvaluator
+from Islands import IslandModel
+from Checkpoints import PlayerArchive, ArchiveWriter
+from GraphingUtil import Graph
+from Profiling import StageTimer
+from Selection import Selection
+from Evolution import EvolutionStrategy
+from Courses import ObstacleSchedule, CourseEvaluator
+
+
+class HeadlessTrainer:
+    # class that trains generations of dinos without a window (no kivy imports)
+    # it runs the same generation loop as the learn scene but without drawing, as fast as the cpu allows
+    DT = 0.01 # the delta time of every frame (the interval the game widget schedules the game at)
+    ENGINES = {'object': DinoGen, 'vector': VecDinoGen} # the simulation engines that can be trained
+
+    def __init__(self, n, net_shape, actv_f, out_f, mut_f, canv_size=(800, 600), path='assets', engine='object',
+                 crossover='uniform', workers=1, seed=None, replay_dir=None, archive=None, save_population=False,
+                 resume=False, plot=None, profile=None, selection=None, optimizer=None, courses=None,
+                 average=False):
+        # an init function for the headless trainer class
+        # the function receives the amount of agents, the shape of the network, the activation function for the
+        # hidden layers, the activation function for the output layer, the mutation function,
+        # the size of the (imaginary) canvas the games run on, the name of the simulation engine
+        # the crossover mode of the networks, the number of worker processes that evaluate the population
+        # the run seed, with a seed the whole run is deterministic (see DinoGen)
+        # a directory the replay of the best player of every generation is saved to (None to not save replays)
+        # and an archive directory the best player of every generation is appended to while training
+        # (None to only save at the end), with save_population the whole latest population is kept in it too
+        # and if resume is true the training continues from the population saved in the archive
+        # an image file the graph of the scores is saved to after every generation (None to not draw it)
+        # a jsonl file the time of every stage of every generation is appended to (None to not time the stages)
+        # the selection strategy of the parents and elites (see Selection, None for the default lineage selection)
+        # an evolution strategy that replaces the genetic algorithm (see Evolution, None for the genetic algorithm)
+        # the number of shared obstacle courses of every generation (see Courses, None for every game drawing
+        # its own obstacles) and if average is true every genome runs all the courses and gets its mean score
+        if replay_dir is not None and workers > 1:
+            raise ValueError("replays can only be recorded when the population is evaluated in a single process")
+        if resume and archive is None:
+            raise ValueError("an archive is needed to resume training")
+        if average and (courses is None or workers > 1 or replay_dir is not None):
+            raise ValueError("averaging over courses needs courses and a single process without replays")
+        self.scores = [] # the score of the best player in every generation
+        self.net_shape = net_shape
+        self.replay_dir = replay_dir
+        self.evaluator = None # evaluates the population on a pool of processes when more than one worker is used
+        self.plot = plot is not None
+        self.average = average # every genome runs all the courses and the evaluator returns its mean score
+        self.timer = StageTimer(profile) if profile is not None else StageTimer.DISABLED
+        self.record = None # the stage times of the last generation (None if the stages aren't timed)
+        Graph.set_mode('file' if self.plot else 'off', plot)
+
+        if seed is not None:
+            rd.seed(seed)
+            np.random.seed(seed)
+        self.gm = HeadlessTrainer.ENGINES[engine](n, seed=seed, optimizer=optimizer)
+        self.gm.init_games(canv_size=canv_size, path=path)
+        self.gm.init_net(DinoGameManager.IN_LEN, net_shape, actv_f, out_f, mut_f, crossover=crossover)
+        self.gm.set_timer(self.timer)
+        if selection is not None:
+            self.gm.set_selection(selection)
+        if resume:
+            self.gm.resume(archive)
+            self.scores = [int(p[0]) for p in self.gm.get_best_players()]
+        schedule = ObstacleSchedule(courses, seed) if courses is not None else None
+        if average:
+            self.evaluator = CourseEvaluator(n, schedule, net_shape, actv_f, out_f, mut_f, canv_size, path, seed)
+        else:
+            self.gm.set_schedule(schedule)
+        if workers > 1:
+            self.evaluator = ParallelEvaluator(workers, n, net_shape, actv_f, out_f, mut_f, canv_size, path, seed=seed,
+                                               schedule=schedule)
+        if replay_dir is not None:
+            os.makedirs(replay_dir, exist_ok=True)
+            self.gm.record_replays()
+        if archive is not None:
+            self.gm.set_writer(ArchiveWriter(archive, net_shape, population=save_population or resume,
+                                             append=resume, rows=self.gm.gen))
+
+    def run_generation(self, dt=DT):
+        # runs a single generation until all the dinos are dead then mutates and restarts the games
+        # (the same order of calls as the learn scene) and returns the score of the best player
+        # with workers the final scores are gathered from the processes and the best players the generation had
+        # are picked from them (the same parents a single process picks), with averaged scores the parents are
+        # the two genomes with the best mean scores
+        gen = self.gm.gen
+        if self.evaluator is not None:
+            with self.timer.stage('evaluation'):
+                self.gm.set_scores(self.evaluator.evaluate(self.gm.nets, dt, self.gm.gen))
+            if self.average: # averaged scores have no frames, the two best genomes are the last leaders
+                self.gm.add_best(Selection.top(self.gm.scores, 2)[::-1])
+            else:
+                self.gm.replay_best()
+        while self.gm.not_all_dead() and self.evaluator is None:
+            with self.timer.stage('best'):
+                self.gm.return_best()
+            self.gm.single_frame(dt)
+
+        self.scores += [int(self.gm.get_score(self.gm.best[-1]))]
+        if self.plot:
+            with self.timer.stage('plotting'):
+                Graph.plot(self.scores)
+        if self.replay_dir is not None:
+            replay = self.gm.get_replay(self.gm.best[-1])
+            replay.save(os.path.join(self.replay_dir, f"gen_{self.gm.gen:05d}.replay"))
+        with self.timer.stage('mutation'):
+            self.gm.mutate()
+            self.gm.restart()
+        self.record = self.timer.end_generation(gen, score=self.scores[-1])
+        return self.scores[-1]
+
+    def train(self, gens, dt=DT, verbose=True):
+        # trains the passed amount of generations and returns the best players of all the generations
+        # (a resumed trainer trains the passed amount on top of the generations that were already trained)
+        last = self.gm.gen + gens
+        self.timer.reset()
+        for _ in range(gens):
+            start = t.time()
+            score = self.run_generation(dt)
+            if verbose:
+                print(f"gen {self.gm.gen}/{last} score: {score} time: {t.time() - start:.3f}s")
+                if self.record is not None:
+                    print(StageTimer.describe(self.record))
+        return self.gm.get_best_players()
+
+    def save(self, path=PlayerArchive.DEFAULT_PATH):
+        # saves the best players to an archive directory in the same format the scene manager saves them
+        PlayerArchive.save(path, self.gm.get_best_players(), self.net_shape)
+
+    def close(self):
+        # stops the worker processes (if there are any) and finishes writing the archive and the graph
+        # (the graph is last so a failed graph never keeps the archive from being written)
+        if self.evaluator is not None:
+            self.evaluator.close()
+            self.evaluator = None
+        if self.gm.writer is not None:
+            self.gm.writer.close()
+            self.gm.set_writer(None)
+        self.timer.close()
+        Graph.remove_out()
+
+
+def main(argv=None):
+    # command line entry point, e.g. python -m Trainer train --gens 500 --pop 50
+    parser = argparse.ArgumentParser(prog='Trainer', description='train dinos without a window')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help='train generations of dinos and save the best players')
+    train.add_argument('--gens', type=int, default=10, help='number of generations')
+    train.add_argument('--pop', type=int, default=50, help='number of agents in every generation')
+    train.add_argument('--hidden', type=int, nargs='*', default=[3], help='sizes of the hidden layers')
+    train.add_argument('--activation', choices=Activations.names(), default='leaky_relu',
+                       help='activation function of the hidden layers')
+    train.add_argument('--out-activation', choices=Activations.names(), default='leaky_relu',
+                       help='activation function of the output layer')
+    train.add_argument('--mutation', choices=Mutations.names(), default='bell', help='mutation distribution')
+    train.add_argument('--crossover', choices=Nets.CROSSOVER_MODES, default='uniform', help='crossover mode')
+    train.add_argument('--selection', choices=Selection.STRATEGIES, default='lineage',
+                       help='how the parents of the next generation are picked')
+    train.add_argument('--elites', type=int, default=0,
+                       help='number of best players carried unchanged into the next generation')
+    train.add_argument('--parents', type=int, default=2,
+                       help='number of parents of every child (the top players of truncation selection)')
+    train.add_argument('--tournament-size', type=int, default=3, help='number of players in every tournament')
+    train.add_argument('--optimizer', choices=EvolutionStrategy.NAMES, default=None,
+                       help='an evolution strategy instead of the genetic algorithm (selection options are ignored)')
+    train.add_argument('--sigma', type=float, default=None, help='initial noise of the evolution strategy')
+    train.add_argument('--lr', type=float, default=None, help='learning rate of openai_es')
+    train.add_argument('--courses', type=int, default=None,
+                       help='number of obstacle courses shared by the games of every generation (own obstacles by default)')
+    train.add_argument('--average', action='store_true',
+                       help='run every genome on all the courses and use its mean score (needs --courses)')
+    train.add_argument('--workers', type=int, default=1, help='number of processes that evaluate the population')
+    train.add_argument('--seed', type=int, default=None, help='run seed, makes the run deterministic')
+    train.add_argument('--replays', default=None, help='directory to save the replay of every generation\'s best')
+    train.add_argument('--dt', type=float, default=None,
+                       help=f'delta time of every frame ({HeadlessTrainer.DT} by default, '
+                            f'seeded runs always use {DinoGen.FIXED_DT})')
+    train.add_argument('--engine', choices=HeadlessTrainer.ENGINES, default='object', help='simulation engine')
+    train.add_argument('--out', default=PlayerArchive.DEFAULT_PATH,
+                       help='the best players archive directory, appended to after every generation')
+    train.add_argument('--save-population', action='store_true', help='also keep the latest population in the archive')
+    train.add_argument('--plot', default=None, help='image file to save the graph of the scores to (no graph by default)')
+    train.add_argument('--profile', default=None, help='jsonl file to append the stage times of every generation to')
+    train.add_argument('--resume', action='store_true',
+                       help='continue from the population saved in the archive (use the same options as the saved run)')
+
+    islands = commands.add_parser('islands', help='train several populations in separate processes with migration')
+    islands.add_argument('--gens', type=int, default=10, help='number of generations')
+    islands.add_argument('--islands', type=int, default=4, help='number of islands (processes)')
+    islands.add_argument('--pop', type=int, default=50, help='number of agents in every island')
+    islands.add_argument('--migrate-every', type=int, default=10, help='number of generations between migrations')
+    islands.add_argument('--migrants', type=int, default=2, help='number of players every island sends to the next')
+    islands.add_argument('--hidden', type=int, nargs='*', default=[3], help='sizes of the hidden layers')
+    islands.add_argument('--activation', choices=Activations.names(), default='leaky_relu',
+                         help='activation function of the hidden layers')
+    islands.add_argument('--out-activation', choices=Activations.names(), default='leaky_relu',
+                         help='activation function of the output layer')
+    islands.add_argument('--mutation', choices=Mutations.names(), default='bell', help='mutation distribution')
+    islands.add_argument('--crossover', choices=Nets.CROSSOVER_MODES, default='uniform', help='crossover mode')
+    islands.add_argument('--selection', choices=Selection.STRATEGIES, default='lineage',
+                         help='how the parents of the next generation are picked')
+    islands.add_argument('--elites', type=int, default=0,
+                         help='number of best players carried unchanged into the next generation')
+    islands.add_argument('--parents', type=int, default=2,
+                         help='number of parents of every child (the top players of truncation selection)')
+    islands.add_argument('--tournament-size', type=int, default=3, help='number of players in every tournament')
+    islands.add_argument('--seed', type=int, default=None, help='run seed, makes the run deterministic')
+    islands.add_argument('--dt', type=float, default=None,
+                         help=f'delta time of every frame ({HeadlessTrainer.DT} by default, '
+                              f'seeded runs always use {DinoGen.FIXED_DT})')
+    islands.add_argument('--engine', choices=HeadlessTrainer.ENGINES, default='object', help='simulation engine')
+    islands.add_argument('--out', default=PlayerArchive.DEFAULT_PATH,
+                         help='the best players archive directory, appended to after every migration')
+
+    convert = commands.add_parser('convert', help='convert an old pickled best players file to an archive')
+    convert.add_argument('--src', default=PlayerArchive.LEGACY_FILENAME, help='the old best players file')
+    convert.add_argument('--dst', default=PlayerArchive.DEFAULT_PATH, help='the archive directory')
+    args = parser.parse_args(argv)
+
+    if args.command in ('train', 'islands'):
+        # a seeded run steps every frame by the fixed delta time (see DinoGen), a different one would be ignored
+        if args.seed is not None and args.dt is not None and args.dt != DinoGen.FIXED_DT:
+            parser.error(f"--dt can't be changed in a seeded run, "
+                         f"every frame uses the fixed delta time {DinoGen.FIXED_DT}")
+        args.dt = HeadlessTrainer.DT if args.dt is None else args.dt
+        net_shape = [(h, 1) for h in args.hidden] + [(DinoGameManager.OUT_LEN, 1)]
+        selection = Selection(args.selection, args.elites, args.parents, args.parents, args.tournament_size)
+    if args.command == 'train':
+        optimizer = None
+        if args.optimizer is not None:
+            params = {'sigma': args.sigma, 'lr': args.lr}
+            optimizer = EvolutionStrategy.create(args.optimizer, **{k: v for k, v in params.items() if v is not None})
+        trainer = HeadlessTrainer(args.pop, net_shape, args.activation, args.out_activation, args.mutation,
+                                  engine=args.engine, crossover=args.crossover, workers=args.workers,
+                                  seed=args.seed, replay_dir=args.replays, archive=args.out,
+                                  save_population=args.save_population, resume=args.resume, plot=args.plot,
+                                  profile=args.profile, selection=selection, optimizer=optimizer,
+                                  courses=args.courses, average=args.average)
+        try:
+            trainer.train(args.gens, args.dt)
+        finally:
+            trainer.close()
+        print(f"saved {trainer.gm.gen} generations to {args.out}")
+    elif args.command == 'islands':
+        model = IslandModel(args.islands, args.pop, net_shape, args.activation, args.out_activation, args.mutation,
+                            crossover=args.crossover, engine=args.engine, migrate_every=args.migrate_every,
+                            migrants=args.migrants, seed=args.seed, dt=args.dt, selection=selection)
+        model.set_writer(ArchiveWriter(args.out, net_shape))
+        try:
+            model.train(args.gens)
+        finally:
+            model.close()
+        print(f"saved {model.gen} generations to {args.out}")
+    elif args.command == 'convert':
+        archive = PlayerArchive.convert(args.src, args.dst)
+        print(f"converted {len(archive)} players to {args.dst}")
+
+
+if __name__ == '__main__':
+    main()
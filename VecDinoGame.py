@@ -0,0 +1,305 @@
+from DinoGame import *
+
+
+class VecDinoGen(DinoGen):
+    # struct of arrays version of the DinoGen class (backend)
+    # instead of a list of game manager objects every part of the game state (dino position, speed, flags,
+    # the current obstacle ...) is a numpy array of length n and a single step advances all the games at once
+    # the physics, collisions and obstacle spawning are the same as in the game manager, dino and obstacle classes
+    # so for the same seeds (random and numpy.random) both engines produce the same scores
+
+    # obstacle kinds in the order DinoGameManager.spawn draws them
+    BIRD = 0
+    SMALL_CACTUS = 1
+    LARGE_CACTUS = 2
+
+    def __init__(self, n, maxnotmin=True, seed=None, offset=0, optimizer=None):
+        # an init function for the VecDinoGen class
+        # receives the same values as the DinoGen class
+        super().__init__(n, maxnotmin, seed, offset, optimizer)
+        self.games = None # there are no game manager objects in this engine
+        self.rngs = None # the random stream of every game (deterministic mode only)
+        self.course = None # the obstacle course of every game (with an obstacle schedule only)
+        self.spawned = None # the number of obstacles every game read from its course
+        self.frames = None # the number of frames every dino was alive for
+        self.alive = None # the indexes of the games whose dinos are still alive (the only games that are stepped)
+
+        # replay recording of all the games (see record_replays)
+        self.recording = False
+        self.rec_dts = [] # delta time of every frame
+        self.rec_actions = [] # the actions of all the games after every frame
+        self.rec_spawns = [] # (frame, game indexes, kinds, types) of every spawn
+        self.imgs = None
+        self.canv_size = None
+
+        self.inputs = None # the last inputs passed to the neural networks
+        self.game_inputs = None # the last inputs of every game (the inputs of the living games are copied in)
+
+        # game state
+        self.time = None # current game time (also the score) of every game, the same array as scores
+        self.mtime = None # animation frame of every game
+
+        # dino state
+        self.x = None
+        self.y = None
+        self.prevY = None
+        self.v = None
+        self.a = None
+        self.enabled = None # Dead or not
+        self.jumping = None # Jumping or not
+        self.ducking = None # Ducking or not
+        self.ducked = None # is the dino using the ducking size (the ducking flag and the size aren't always equal)
+
+        # current obstacle state
+        self.has_obst = None # does the game have an obstacle
+        self.ox = None
+        self.oy = None
+        self.ow = None
+        self.oh = None
+        self.okind = None # bird, small cactus or large cactus
+        self.otype = None # the index of the image of the obstacle
+
+        # size tables
+        self.run_size = None
+        self.duck_size = None
+        self.obst_w = None # width of obstacle [kind, type]
+        self.obst_h = None # height of obstacle [kind, type]
+        self.obst_y = None # y position of obstacle [kind, type]
+
+    def init_games(self, canv_size=(800, 600), path='assets', img=None):
+        # initializes the state arrays of all the games and the size tables of the dino and obstacles
+        self.imgs = DinoGameManager.Find_Dino_Images(path) if img is None else img
+        self.canv_size = canv_size
+
+        self.run_size = self.imgs['DinoRun'][0]['size']
+        self.duck_size = self.imgs['DinoDuck'][0]['size']
+
+        kinds = ['Bird', 'SmallCactus', 'LargeCactus']
+        self.obst_w = np.zeros((3, 3))
+        self.obst_h = np.zeros((3, 3))
+        self.obst_y = np.zeros((3, 3))
+        for kind, name in enumerate(kinds):
+            for rand in range(3):
+                size = self.imgs[name][0 if kind == VecDinoGen.BIRD else rand]['size']
+                self.obst_w[kind, rand], self.obst_h[kind, rand] = size
+                if kind == VecDinoGen.BIRD:
+                    self.obst_y[kind, rand] = DinoGameManager.BIRD_HEIGHTS[rand]
+
+        self.restart()
+
+    def not_initialized(self):
+        # returns true if the state arrays or the networks aren't initialized yet
+        return (self.nets is None) or (self.time is None)
+
+    def check_dead(self):
+        # returns the number of active (dinos that are alive) games
+        return len(self.alive)
+
+    def get_score(self, i):
+        # returns the score (game time) of the ith game
+        return float(self.time[i])
+
+    def set_scores(self, scores):
+        # sets the score (game time) of every game, used when the games were evaluated somewhere else
+        self.time[:] = scores
+
+    def spawn(self, idxs):
+        # spawns a random obstacle in every game at the passed (sorted) indexes
+        # the random values are drawn in game order the same way DinoGameManager.spawn draws them
+        if len(idxs) == 0:
+            return
+        if self.schedule is not None: # the next obstacles of the courses of the games
+            kind, rand = self.schedule.take(self.course[idxs], self.spawned[idxs])
+            self.spawned[idxs] += 1
+        else:
+            rngs = self.rngs if self.rngs is not None else [None] * self.n
+            draws = np.array([DinoGameManager.draw_obstacle(rngs[i]) for i in idxs]).reshape(-1, 2)
+            kind, rand = draws[:, 0], draws[:, 1]
+
+        self.has_obst[idxs] = True
+        self.ox[idxs] = self.canv_size[0]
+        self.oy[idxs] = self.obst_y[kind, rand]
+        self.ow[idxs] = self.obst_w[kind, rand]
+        self.oh[idxs] = self.obst_h[kind, rand]
+        self.okind[idxs] = kind
+        self.otype[idxs] = np.where(kind == VecDinoGen.BIRD, 0, rand)
+        if self.recording:
+            self.rec_spawns.append((len(self.rec_dts) - 1, idxs, kind, rand))
+
+    def check_collisions(self, err, idxs):
+        # checks for collisions between the dinos at the passed indexes and their current obstacles
+        # with the passed error range, returns a boolean array (an element for every index)
+        ducked = self.ducked[idxs]
+        x, y = self.x[idxs], self.y[idxs]
+        oy = self.oy[idxs]
+        w = np.where(ducked, self.duck_size[0], self.run_size[0])
+        h = np.where(ducked, self.duck_size[1], self.run_size[1])
+        ox = self.ox[idxs] + err
+        oxw = self.ox[idxs] + self.ow[idxs]
+        oyh = oy + self.oh[idxs] * 0.75
+        xCol = ((x + w >= ox) & (ox >= x)) | ((x + w >= oxw) & (oxw >= x))
+        yCol = ((y + h >= oy) & (oy >= y)) | ((y + h >= oyh) & (oyh >= y))
+        return xCol & yCol
+
+    def update_all(self, dt):
+        # updates all computational aspects of all the games (DinoGameManager.updateAll for every game)
+        # only the games that are alive are touched so a frame costs as much as the number of living dinos
+        alive = self.alive
+        self.frames[alive] += 1
+        if self.recording:
+            self.rec_dts.append(dt)
+
+        time = self.time[alive]
+        self.mtime[alive] = (time * 3 // DinoGameManager.MOD) % 2
+        self.time[alive] = time + dt * DinoGameManager.GAME_SPEED * 2
+
+        self.spawn(alive[~self.has_obst[alive]])
+
+        # dino update
+        hit = self.check_collisions(DinoGameManager.ERR, alive)
+        dead = alive[hit]
+        self.enabled[dead] = False
+        self.ducked[dead] = False
+        move = alive[~hit]
+        y = self.y[move]
+        self.jumping[move[self.jumping[move] & (y == 0) & (self.prevY[move] != 0)]] = False
+        self.prevY[move] = y
+        v = self.v[move] + self.a[move]
+        self.v[move] = v
+        self.y[move] = np.maximum(y + v, 0)
+
+        # obstacle update
+        ox = self.ox[alive] - (DinoGameManager.GAME_SPEED + self.time[alive] // DinoGameManager.GAME_ACC)
+        self.ox[alive] = ox
+        out = alive[ox + self.ow[alive] + DinoGameManager.ERR < 0]
+        self.has_obst[out] = False
+        self.spawn(out)
+        self.alive = move
+
+    def get_inputs(self, idxs):
+        # returns the inputs for the neural networks of the games at the passed indexes
+        self.inputs = np.empty((len(idxs), DinoGameManager.IN_LEN, 1))
+        self.inputs[:, 0, 0] = self.ox[idxs] - self.x[idxs] # distance x
+        self.inputs[:, 1, 0] = self.oy[idxs] - self.y[idxs] # distance y
+        self.inputs[:, 2, 0] = self.oh[idxs] # height of obstacle
+        self.inputs[:, 3, 0] = self.ducking[idxs] # ducking
+        self.inputs[:, 4, 0] = self.jumping[idxs] # jumping
+        self.game_inputs[idxs] = self.inputs
+        return self.inputs
+
+    def get_game_inputs(self, i):
+        # returns the last inputs the network of the ith game received
+        return self.game_inputs[i]
+
+    def take_actions(self, out, idxs):
+        # makes the (living) games at the passed indexes take the actions at the passed indexes
+        # (the same order as DinoGameManager.actions)
+        unduck = idxs[(out == 0) & self.ducked[idxs]]
+        self.ducking[unduck] = False
+        self.ducked[unduck] = False
+        self.a[unduck] = Dino.JUMP_ACC
+
+        duck = idxs[(out == 1) & ~self.ducked[idxs]]
+        self.ducking[duck] = True
+        self.ducked[duck] = True
+        self.a[duck] = Dino.DUCK_ACC
+
+        jump = idxs[(out == 3) & ~self.jumping[idxs]]
+        self.jumping[jump] = True
+        self.v[jump] = Dino.JUMP_VEL
+
+    def single_pass(self):
+        # a single action pass for all the games
+        # this function calculates the networks outputs of the living dinos and makes each of them take the next
+        # action, the last outputs of the dead dinos are left as they were
+        if self.not_initialized():
+            return
+        if self.out is None:
+            self.out = np.zeros((self.n, 1), dtype=int)
+            self.output = np.zeros((self.n, DinoGameManager.OUT_LEN, 1))
+        alive = self.alive
+        if len(alive) > 0:
+            out, output = self.nets.forward_pass(self.get_inputs(alive), self.maxnotmin,
+                                                 None if len(alive) == self.n else alive)
+            self.out[alive] = out
+            self.output[alive] = output
+            self.take_actions(out[:, 0], alive)
+        if self.recording: # dead dinos don't do actions (the same as a replay recorder)
+            actions = np.full(self.n, DinoGameManager.NO_ACTION, dtype=np.uint8)
+            actions[alive] = self.out[alive, 0]
+            self.rec_actions.append(actions)
+
+    def single_frame(self, dt):
+        # runs a single game frame for all the games and then picks an action for each dino
+        # receives the delta time from the last frame\update (ignored in deterministic mode)
+        if self.seed is not None:
+            dt = DinoGen.FIXED_DT
+        with self.timer.stage('simulation'):
+            self.update_all(dt)
+        with self.timer.stage('inference'):
+            self.single_pass()
+
+    def restart(self):
+        # restarts all the games
+        self.time = np.zeros(self.n)
+        self.scores = self.time
+        self.mtime = np.zeros(self.n, dtype=int)
+        self.frames = np.zeros(self.n, dtype=int)
+        self.alive = np.arange(self.n)
+        self.game_inputs = np.zeros((self.n, DinoGameManager.IN_LEN, 1))
+        self.rec_dts = []
+        self.rec_actions = []
+        self.rec_spawns = []
+
+        self.x = np.zeros(self.n)
+        self.y = np.zeros(self.n)
+        self.prevY = np.zeros(self.n)
+        self.v = np.zeros(self.n)
+        self.enabled = np.ones(self.n, dtype=bool)
+        self.jumping = np.zeros(self.n, dtype=bool)
+        self.ducking = np.zeros(self.n, dtype=bool)
+        self.ducked = np.zeros(self.n, dtype=bool)
+        self.a = np.full(self.n, float(Dino.JUMP_ACC))
+
+        self.has_obst = np.zeros(self.n, dtype=bool)
+        self.ox = np.zeros(self.n)
+        self.oy = np.zeros(self.n)
+        self.ow = np.zeros(self.n)
+        self.oh = np.zeros(self.n)
+        self.okind = np.zeros(self.n, dtype=int)
+        self.otype = np.zeros(self.n, dtype=int)
+        self.seed_games()
+
+    def seed_games(self):
+        # gives every game its own random stream for the current generation (if there is a run seed)
+        # or its course of the current generation (if there is an obstacle schedule)
+        if self.schedule is not None:
+            self.schedule.generate(self.gen)
+            self.course = self.schedule.course_of(self.offset + np.arange(self.n))
+            self.spawned = np.zeros(self.n, dtype=int)
+        elif self.seed is not None:
+            self.rngs = [self.game_rng(i) for i in range(self.n)]
+
+    def vis_state(self):
+        # returns the state the batched renderer draws (see BatchedGenVis), the state arrays themselves:
+        # dino x, dino y, alive, ducking, jumping, animation frame, has an obstacle,
+        # obstacle x, obstacle y, obstacle kind (0 bird, 1 small cactus, 2 large cactus) and obstacle type
+        return (self.x, self.y, self.enabled, self.ducking, self.jumping, self.mtime, self.has_obst,
+                self.ox, self.oy, self.okind, self.otype)
+
+    def record_replays(self):
+        # starts recording all the games so the replay of any game can be taken with get_replay
+        # (the actions of all the games are kept, n bytes per frame)
+        self.recording = True
+
+    def get_replay(self, i):
+        # returns the replay of the ith game in the current generation (the games have to be recorded)
+        # a game is alive from the first frame so its frames are the first frames of the generation
+        from Replay import Replay
+
+        frames = self.frames[i]
+        actions = [a[i] for a in self.rec_actions[:frames]]
+        spawns = [(frame, kind[idxs == i][0], rand[idxs == i][0]) for frame, idxs, kind, rand in self.rec_spawns
+                  if i in idxs]
+        return Replay(self.rec_dts[:frames], actions, spawns, self.canv_size, self.time[i], self.seed, self.gen,
+                      self.offset + i)
@@ -19,6 +19,9 @@ from Scenes import *
 
 class GameWidget(Widget):
     # class that runs contains and manages the main parts of the project
+    ACTIVATION = 'leaky_relu' # activation function for all layers in network - hidden layers and output layer ~
+    MUTATION = 'bell' # a mathematical function for calculating mutation probabilities ~
+
     def __init__(self, **kwargs):
         # init function for the game widget that initializes the scene manager
         super().__init__(**kwargs)
@@ -31,7 +34,10 @@ class GameWidget(Widget):
 
         self.n = 50
         net_shape = [(3,1),(DinoGameManager.OUT_LEN, 1)]
-        self.scene_manager = SceneManager(self,self.n,net_shape,GameWidget.Activation,GameWidget.Activation,GameWidget.bell)
+        # the activation functions are picked by name from the Activations class
+        # (leaky_relu, relu, tanh, sigmoid, softplus, identity) and the mutation function from the Mutations class
+        # (bell), any python function also works but is slower
+        self.scene_manager = SceneManager(self,self.n,net_shape,GameWidget.ACTIVATION,GameWidget.ACTIVATION,GameWidget.MUTATION)
         Clock.schedule_interval(self.run_game,0.01)
 
     def run_game(self,dt):
@@ -60,15 +66,6 @@ class GameWidget(Widget):
         # receives the keycode of the key pressed (a string of the pressed key)
         self.scene_manager.key_up(keycode)
 
-    @staticmethod
-    def Activation(x):
-        # activation function for all layers in network - hidden layers and output layer ~
-        return max(x, 0.1 * x)
-    @staticmethod
-    def bell(x):
-        # a mathematical function for calculating mutation probabilities ~
-        return 0.1 * x ** 3
-
 class MyApp(App):
     # class responsible for managing the app
     # extends the app class from the kivy library
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pytest
+from Checkpoints import ArchiveWriter, PlayerArchive
+from DinoGame import DinoGameManager
+from NetworkClasses import Nets
+
+NET_SHAPE = [(3, 1), (DinoGameManager.OUT_LEN, 1)]
+
+
+def make_players(n, seed=0):
+    # returns n random (score, [weights], [biases]) players
+    np.random.seed(seed)
+    nets = Nets(n, DinoGameManager.IN_LEN, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell')
+    nets.net_weights_init()
+    return [(float(np.random.randint(1000)), *nets.get_ith_net(i)) for i in range(n)]
+
+
+def assert_same_player(a, b):
+    # checks that two players have the same score, weights and biases
+    assert a[0] == b[0]
+    for x, y in zip(a[1] + a[2], b[1] + b[2]):
+        assert np.array_equal(x, y)
+
+
+def test_save_and_open_memory_mapped(tmp_path):
+    players = make_players(6)
+    PlayerArchive.save(str(tmp_path), players, NET_SHAPE)
+    archive = PlayerArchive.open(str(tmp_path))
+    assert isinstance(archive.params, np.memmap) and isinstance(archive.scores, np.memmap)
+    assert len(archive) == len(players)
+    assert archive.net_shape == NET_SHAPE
+    for player, row in zip(players, archive):
+        assert_same_player(player, row)
+    assert archive.best_index() == int(np.argmax([p[0] for p in players]))
+
+
+def test_empty_archive(tmp_path):
+    archive = PlayerArchive.save(str(tmp_path), [], NET_SHAPE)
+    assert len(archive) == 0
+
+
+def test_open_rejects_other_shapes(tmp_path):
+    PlayerArchive.save(str(tmp_path), make_players(2), NET_SHAPE)
+    header = tmp_path / PlayerArchive.HEADER_FILENAME
+    header.write_text(header.read_text().replace('"params_len": ', '"params_len": 1'))
+    with pytest.raises(ValueError):
+        PlayerArchive.open(str(tmp_path))
+
+
+def test_writer_append(tmp_path):
+    players = make_players(8)
+    writer = ArchiveWriter(str(tmp_path), NET_SHAPE, sync_every=2)
+    for p in players[:5]:
+        writer.put(p)
+    writer.close()
+    assert len(PlayerArchive.open(str(tmp_path))) == 5
+
+    # appending keeps the first rows and overwrites the ones after them
+    writer = ArchiveWriter(str(tmp_path), NET_SHAPE, append=True, rows=4)
+    for p in players[5:]:
+        writer.put(p)
+    writer.close()
+    archive = PlayerArchive.open(str(tmp_path))
+    assert len(archive) == 7
+    for player, row in zip(players[:4] + players[5:], archive):
+        assert_same_player(player, row)
+
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(tmp_path), [(5, 1), (DinoGameManager.OUT_LEN, 1)], append=True)
+
+
+def test_writer_population_state(tmp_path):
+    np.random.seed(1)
+    nets = Nets(6, DinoGameManager.IN_LEN, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell')
+    nets.net_weights_init()
+    writer = ArchiveWriter(str(tmp_path), NET_SHAPE, sync_every=1, population=True)
+    for gen in range(3):
+        writer.put((float(gen), *nets.get_ith_net(0)))
+        writer.put_state(nets.weights, nets.bias, {'gen': gen, 'best': [0]})
+        saved = nets.weights, nets.bias # mutate creates new arrays
+        nets.mutate([0, 1])
+    writer.close()
+
+    weights, bias, state = PlayerArchive.open(str(tmp_path)).load_state()
+    assert state['gen'] == 2 and state['best'] == [0]
+    for x, y in zip(weights + bias, saved[0] + saved[1]):
+        assert np.array_equal(x, y)
+    # only the latest population file is kept
+    populations = [f for f in os.listdir(tmp_path) if f.startswith('population_')]
+    assert populations == [PlayerArchive.POPULATION_FILENAME.format(2)]
+
+    # a new archive in the same directory starts without the state of the old run
+    ArchiveWriter(str(tmp_path), NET_SHAPE).close()
+    with pytest.raises(FileNotFoundError):
+        PlayerArchive.open(str(tmp_path)).load_state()
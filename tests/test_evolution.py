@@ -0,0 +1,56 @@
+import json
+import numpy as np
+import pytest
+from DinoGame import DinoGameManager
+from Evolution import EvolutionStrategy
+from NetworkClasses import Nets
+
+NET_SHAPE = [(3, 1), (DinoGameManager.OUT_LEN, 1)]
+
+
+def make_nets(n):
+    # returns n randomly initialized networks
+    nets = Nets(n, DinoGameManager.IN_LEN, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell')
+    nets.net_weights_init()
+    return nets
+
+
+def test_centered_ranks_ties():
+    ranks = EvolutionStrategy.centered_ranks(np.array([1.0, 1.0, 3.0, 2.0]))
+    assert ranks[0] == ranks[1] # equal scores get the average of their ranks
+    assert np.allclose(ranks, [-1 / 3, -1 / 3, 0.5, 1 / 6])
+    assert ranks.min() >= -0.5 and ranks.max() <= 0.5
+    assert ranks.sum() == pytest.approx(0)
+
+
+def test_centered_ranks_all_equal():
+    assert np.allclose(EvolutionStrategy.centered_ranks(np.full(5, 7.0)), 0)
+
+
+@pytest.mark.parametrize('name', list(EvolutionStrategy.NAMES))
+def test_state_round_trip(name):
+    np.random.seed(0)
+    nets = make_nets(8)
+    strategy = EvolutionStrategy.create(name)
+    strategy.init(nets)
+    for _ in range(3):
+        strategy.step(nets, np.random.random(nets.n) * 100)
+
+    # the state goes through json like the training state
+    resumed_nets = make_nets(8)
+    resumed_nets.set_flat(nets.get_flat())
+    resumed = EvolutionStrategy.create(name)
+    resumed.init(resumed_nets)
+    resumed.set_state(json.loads(json.dumps(strategy.get_state())))
+
+    scores = np.random.random(nets.n) * 100
+    for s, n in ((strategy, nets), (resumed, resumed_nets)):
+        np.random.seed(1)
+        s.step(n, scores)
+    assert np.array_equal(nets.get_flat(), resumed_nets.get_flat())
+    assert json.dumps(strategy.get_state()) == json.dumps(resumed.get_state())
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        EvolutionStrategy.create('simulated_annealing')
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import pytest
+from DinoGame import DinoGameManager
+from Trainer import HeadlessTrainer
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+NET_SHAPE = [(3, 1), (DinoGameManager.OUT_LEN, 1)]
+
+
+def train(workers, engine='object', selection=None, gens=6):
+    # trains a small seeded population and returns its best players lineage and the score of every generation
+    trainer = HeadlessTrainer(16, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell', path=ASSETS, engine=engine,
+                              workers=workers, seed=7, selection=selection)
+    try:
+        scores = [trainer.run_generation() for _ in range(gens)]
+    finally:
+        trainer.close()
+    return trainer.gm.best, scores
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_workers_match_single_process(workers):
+    # a seeded parallel run breeds from the same parents as a single process (the lineage is rebuilt from the scores)
+    assert train(workers) == train(1)
+
+
+def test_workers_match_vector_engine():
+    assert train(3) == train(1, engine='vector')
+
+
+def test_average_breeds_from_best_mean_scores():
+    # with course averaging the lineage parents are the two genomes with the best mean scores
+    trainer = HeadlessTrainer(16, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell', path=ASSETS, seed=3, courses=3,
+                              average=True)
+    evaluate = trainer.evaluator.evaluate
+    results = []
+    trainer.evaluator.evaluate = lambda *args: results.append(evaluate(*args)) or results[-1]
+    try:
+        for _ in range(4):
+            trainer.run_generation()
+            scores = results[-1]
+            assert list(scores[trainer.gm.best[:-3:-1]]) == list(np.sort(scores)[:-3:-1])
+    finally:
+        trainer.close()
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pytest
+from DinoGame import DinoGameManager
+from Replay import Replay, ReplayPlayer
+from Trainer import HeadlessTrainer
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+NET_SHAPE = [(3, 1), (DinoGameManager.OUT_LEN, 1)]
+
+
+def assert_same_replay(a, b):
+    # checks that two replays hold the same recording
+    assert np.array_equal(a.dts, b.dts)
+    assert np.array_equal(a.actions, b.actions)
+    assert a.spawns == b.spawns
+    assert (a.canv_size, a.score, a.seed, a.gen, a.index) == (b.canv_size, b.score, b.seed, b.gen, b.index)
+
+
+def test_encode_decode_round_trip():
+    dts = [0.01] * 300 + [0.02] * 5 + [0.01] * 1000
+    actions = [DinoGameManager.NO_ACTION] * 200 + [0] * 3 + [DinoGameManager.NO_ACTION] * 1102
+    spawns = [(0, 0, 1), (150, 1, 2), (151, 0, 0), (1200, 1, 0)]
+    replay = Replay(dts, actions, spawns, (640, 480), 13.05, seed=None, gen=4, index=17)
+    assert_same_replay(Replay.decode(replay.encode()), replay)
+
+
+def test_decode_rejects_other_files():
+    with pytest.raises(ValueError):
+        Replay.decode(b'not a replay at all')
+
+
+@pytest.mark.parametrize('engine', ['object', 'vector'])
+def test_recorded_replay_plays_back_to_its_score(tmp_path, engine):
+    # the replay of a seeded generation's best player is saved, loaded and replayed without the network
+    trainer = HeadlessTrainer(16, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell', path=ASSETS, engine=engine, seed=5,
+                              replay_dir=str(tmp_path))
+    try:
+        score = trainer.run_generation()
+    finally:
+        trainer.close()
+    files = sorted(os.listdir(tmp_path))
+    assert files == ['gen_00000.replay']
+
+    replay = Replay.load(os.path.join(tmp_path, files[0]))
+    assert replay.seed == 5 and int(replay.score) == score
+    player = ReplayPlayer(replay, path=ASSETS)
+    assert player.play() == pytest.approx(replay.score)
+    assert not player.game.dino_not_dead()
+
+    # seeking back to the start and playing again gives the same game
+    player.seek(0)
+    assert player.frame == 0
+    assert player.play() == pytest.approx(replay.score)
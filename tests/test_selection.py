@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from DinoGame import DinoGameManager
+from NetworkClasses import Nets
+from Selection import Selection
+
+NET_SHAPE = [(3, 1), (DinoGameManager.OUT_LEN, 1)]
+
+
+def make_nets(n, seed=0):
+    # returns n randomly initialized networks
+    np.random.seed(seed)
+    nets = Nets(n, DinoGameManager.IN_LEN, NET_SHAPE, 'leaky_relu', 'leaky_relu', 'bell')
+    nets.net_weights_init()
+    return nets
+
+
+@pytest.mark.parametrize('strategy', ['truncation', 'tournament', 'proportional', 'rank'])
+def test_elites_are_carried_unchanged(strategy):
+    nets = make_nets(12)
+    scores = np.random.permutation(12).astype(float) * 10
+    selection = Selection(strategy, elites=3)
+    elites = selection.elites(scores)
+    assert list(elites) == list(np.argsort(-scores)[:3])
+
+    old_w = [w.copy() for w in nets.weights]
+    old_b = [b.copy() for b in nets.bias]
+    nets.mutate(selection.parents(scores, [0]), elites)
+    for layer in range(nets.net_length):
+        assert np.array_equal(nets.weights[layer][:3], old_w[layer][elites])
+        assert np.array_equal(nets.bias[layer][:3], old_b[layer][elites])
+        assert not np.array_equal(nets.weights[layer][3:], old_w[layer][3:]) # the children are mutated
+
+
+@pytest.mark.parametrize('strategy', ['tournament', 'proportional', 'rank'])
+def test_parents_are_valid_indexes(strategy):
+    np.random.seed(1)
+    scores = np.array([5.0, 1.0, 9.0, 9.0, 3.0, 0.5, 7.0, 2.0])
+    parents = Selection(strategy, parents=3).parents(scores, [0])
+    assert parents.shape == (len(scores), 3)
+    assert np.issubdtype(parents.dtype, np.integer)
+    assert parents.min() >= 0 and parents.max() < len(scores)
+
+
+def test_tournament_picks_the_best_player_of_every_tournament():
+    # a tournament of all the players (drawn many times) almost always contains the best player
+    np.random.seed(2)
+    scores = np.arange(6, dtype=float)
+    parents = Selection('tournament', parents=2, tournament_size=50).parents(scores, [0])
+    assert np.all(parents == 5)
+
+
+def test_proportional_never_picks_the_worst_player():
+    # the worst score has no weight above the worst score
+    np.random.seed(3)
+    scores = np.array([4.0, 10.0, 1.0, 6.0])
+    parents = Selection('proportional', parents=2).parents(np.repeat(scores, 25), [0])
+    assert not np.any(np.repeat(scores, 25)[parents] == 1.0)
+
+
+def test_rank_prefers_better_players():
+    np.random.seed(4)
+    scores = np.arange(10, dtype=float)
+    parents = Selection('rank', parents=2).parents(scores, [0])
+    counts = np.bincount(parents.ravel(), minlength=10)
+    assert counts[5:].sum() > counts[:5].sum()
+
+
+def test_lineage_and_truncation():
+    scores = np.array([3.0, 8.0, 8.0, 1.0, 5.0])
+    assert Selection('lineage').parents(scores, [0, 4, 1]) == [1, 4]
+    assert Selection('lineage').parents(scores, [2]) == [2]
+    assert list(Selection('truncation', top=3).parents(scores, [0])) == [1, 2, 4]